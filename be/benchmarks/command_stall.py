@@ -0,0 +1,79 @@
+"""
+command_stall:
+Measures how long SEARCH_SECTOR command handling stalls the simulated drone system.
+
+Every drone is sent a SEARCH_SECTOR command, which is handled on the calling thread as `DroneSystem` does.
+The time spent handling commands is time during which no drone moves.
+Each run is repeated with the same clusters, as happens when drones are re-tasked, so that the second run
+uses cached cluster geometry. Simulated paths that fail, or are not ready within `PATH_TIMEOUT`, are reported.
+
+Usage (from the `be` directory):
+```bash
+python3 -m benchmarks.command_stall --drones 4 40
+```
+"""
+import argparse
+import random
+from time import perf_counter
+
+from constants import HOME_POSITION
+from drone_utils import DroneCommand_SEARCH_SECTOR, DroneId, DroneState, PathAlgo
+from fake_drone_system import Drone
+from maplib import LatLon
+
+N_HOTSPOTS = 10
+SPREAD = 0.0005  # Spread of cluster centres and hotspots around HOME_POSITION, in degrees
+PATH_TIMEOUT = 300.0  # Seconds to wait for the simulated paths of a run
+
+def make_command(rng: random.Random) -> DroneCommand_SEARCH_SECTOR:
+    centre = LatLon(HOME_POSITION.lat + rng.uniform(-SPREAD, SPREAD), HOME_POSITION.lon + rng.uniform(-SPREAD, SPREAD))
+    hotspots = [(centre.lat + rng.uniform(-SPREAD, SPREAD)/2, centre.lon + rng.uniform(-SPREAD, SPREAD)/2) for _ in range(N_HOTSPOTS)]
+    return DroneCommand_SEARCH_SECTOR(centre, hotspots, PathAlgo.BAYES)
+
+def bench(n_drones: int, seed: int = 0) -> tuple[float, float, float, list]:
+    """
+    Returns, in seconds:
+    - The total time spent handling one SEARCH_SECTOR command per drone
+    - The longest time spent handling a single command
+    - The time until every drone's simulated path is available, or has failed
+    And the errors of the simulated paths that failed or timed out.
+    """
+    rng = random.Random(seed)
+    drone_states = {DroneId(i): DroneState(i) for i in range(n_drones)}
+    drones = [Drone(drone_id, drone_states, HOME_POSITION) for drone_id in drone_states]
+    commands = [make_command(rng) for _ in drones]
+
+    start = perf_counter()
+    longest = 0
+    for drone, command in zip(drones, commands):
+        cmd_start = perf_counter()
+        drone.handle_command(command)
+        longest = max(longest, perf_counter() - cmd_start)
+    stall = perf_counter() - start
+
+    deadline = perf_counter() + PATH_TIMEOUT
+    errors = []
+    for drone in drones:
+        try:
+            drone.pathfinder.simulated_path_future.result(timeout=max(deadline - perf_counter(), 0))
+        except Exception as e:
+            errors.append(f"drone {drone.drone_id}: {e!r}")
+    ready = perf_counter() - start
+
+    return stall, longest, ready, errors
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--drones", type=int, nargs="+", default=[4, 40], help="Number of drones")
+    args = parser.parse_args(args)
+
+    print(f"{'drones':>6} {'geometry':>8} {'total stall (s)':>16} {'max stall (s)':>14} {'paths ready (s)':>16} {'failed':>6}")
+    for n_drones in args.drones:
+        for geometry in ("cold", "warm"):
+            stall, longest, ready, errors = bench(n_drones)
+            print(f"{n_drones:>6} {geometry:>8} {stall:>16.3f} {longest:>14.3f} {ready:>16.3f} {len(errors):>6}")
+            for error in errors[:5]:
+                print(f"{'':>6} {error}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+event_soak:
+Soak-tests search missions with many drones on the discrete-event simulation, headless and faster than real time.
+
+Every drone is sent a SEARCH_SECTOR command to one of a few clusters around HOME_POSITION, and the simulation is
+run until every drone has searched its cluster and returned home. The mission would take the reported virtual time
+in `SimulationMode.REAL_TIME`.
+
+Usage (from the `be` directory):
+```bash
+python3 -m benchmarks.event_soak --drones 10 100 500
+```
+"""
+import argparse
+import random
+from queue import Queue
+from time import perf_counter
+
+from constants import HOME_POSITION
+from drone_utils import DroneCommand_SEARCH_SECTOR, DroneId, DroneMode, DroneState, PathAlgo
+from fake_drone_system import Drone, EventSimulation
+from maplib import LatLon
+from pathfinder.shared_map import ProbabilityMapService
+
+N_CLUSTERS = 8
+N_HOTSPOTS = 10
+SPREAD = 0.002  # Spread of cluster centres around HOME_POSITION, in degrees
+HOTSPOT_SPREAD = 0.0002  # Spread of hotspots around the centre of their cluster, in degrees
+
+def make_commands(rng: random.Random, algo: PathAlgo) -> list[DroneCommand_SEARCH_SECTOR]:
+    commands = []
+    for _ in range(N_CLUSTERS):
+        centre = LatLon(HOME_POSITION.lat + rng.uniform(-SPREAD, SPREAD), HOME_POSITION.lon + rng.uniform(-SPREAD, SPREAD))
+        hotspots = [(centre.lat + rng.uniform(-HOTSPOT_SPREAD, HOTSPOT_SPREAD), centre.lon + rng.uniform(-HOTSPOT_SPREAD, HOTSPOT_SPREAD))
+                    for _ in range(N_HOTSPOTS)]
+        commands.append(DroneCommand_SEARCH_SECTOR(centre, hotspots, algo))
+    return commands
+
+def bench(n_drones: int, algo: PathAlgo, seed: int = 0) -> tuple[float, float, int]:
+    """
+    Returns:
+    - The virtual time until every drone is home, in seconds
+    - The wall-clock time taken to simulate it, in seconds
+    - The number of arrival events processed
+    """
+    rng = random.Random(seed)
+    drone_states = {DroneId(i): DroneState(i) for i in range(n_drones)}
+    map_service = ProbabilityMapService()
+    drones = {drone_id: Drone(drone_id, drone_states, HOME_POSITION, map_service) for drone_id in drone_states}
+    commands = Queue()
+    simulation = EventSimulation(drones, commands)
+    cluster_commands = make_commands(rng, algo)
+    for i, drone_id in enumerate(drones):
+        commands.put((drone_id, cluster_commands[i % N_CLUSTERS]))
+
+    start = perf_counter()
+    simulation.run()
+    wall = perf_counter() - start
+
+    assert all(state.get_mode() == DroneMode.IDLE for state in drone_states.values())
+    for drone in drones.values():
+        drone.pathfinder.simulated_path_future.cancel()     # Simulated paths are not needed here
+    return simulation.now, wall, simulation.n_events
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--drones", type=int, nargs="+", default=[10, 100, 500], help="Number of drones")
+    parser.add_argument("--algo", choices=[algo.name.lower() for algo in PathAlgo], default="bayes", help="Search algorithm")
+    args = parser.parse_args(args)
+    algo = PathAlgo[args.algo.upper()]
+
+    print(f"{'drones':>6} {'virtual (s)':>12} {'wall (s)':>9} {'events':>8} {'events/s':>9} {'speed-up':>9}")
+    for n_drones in args.drones:
+        virtual, wall, n_events = bench(n_drones, algo)
+        print(f"{n_drones:>6} {virtual:>12.0f} {wall:>9.2f} {n_events:>8} {n_events / wall:>9.0f} {virtual / wall:>8.0f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+fleet_tick:
+Measures the time taken by one real-time cycle of the simulated drone system, for fleets of different sizes.
+
+Every drone is sent to a random position around HOME_POSITION, and is stepped with `Drone.cycle()` one drone at a
+time, and with one `FleetKinematics.step()` for the whole fleet. The cycle must stay well within
+`DRONE_CYCLE_INTERVAL` to keep up with real time.
+
+Usage (from the `be` directory):
+```bash
+python3 -m benchmarks.fleet_tick --drones 100 1000 10000
+```
+"""
+import argparse
+import random
+from time import perf_counter
+
+from constants import HOME_POSITION
+from drone_utils import DroneCommand_MOVE_TO, DroneId, DroneState
+from fake_drone_system import Drone, FleetKinematics
+from maplib import LatLon
+
+SPREAD = 0.005  # Spread of targets around HOME_POSITION, in degrees
+N_CYCLES = 20
+
+def make_fleet(n_drones: int, seed: int = 0) -> dict:
+    rng = random.Random(seed)
+    drone_states = {DroneId(i): DroneState(i) for i in range(n_drones)}
+    drones = {drone_id: Drone(drone_id, drone_states, HOME_POSITION) for drone_id in drone_states}
+    for drone in drones.values():
+        drone.connect()
+        target = LatLon(HOME_POSITION.lat + rng.uniform(-SPREAD, SPREAD), HOME_POSITION.lon + rng.uniform(-SPREAD, SPREAD))
+        drone.handle_command(DroneCommand_MOVE_TO(target))
+    return drones
+
+def bench(n_drones: int) -> tuple[float, float]:
+    """ Returns the mean time of a cycle of the fleet, in milliseconds, stepping one drone at a time and vectorised. """
+    drones = make_fleet(n_drones)
+    start = perf_counter()
+    for _ in range(N_CYCLES):
+        for drone in drones.values():
+            drone.cycle()
+    per_drone = (perf_counter() - start) / N_CYCLES * 1e3
+
+    fleet = FleetKinematics(make_fleet(n_drones))
+    start = perf_counter()
+    for _ in range(N_CYCLES):
+        fleet.step()
+    vectorised = (perf_counter() - start) / N_CYCLES * 1e3
+    return per_drone, vectorised
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--drones", type=int, nargs="+", default=[100, 1000, 10000], help="Number of drones")
+    args = parser.parse_args(args)
+
+    print(f"{'drones':>6} {'per drone (ms)':>15} {'fleet (ms)':>11}")
+    for n_drones in args.drones:
+        per_drone, vectorised = bench(n_drones)
+        print(f"{n_drones:>6} {per_drone:>15.2f} {vectorised:>11.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+info_encoding:
+Measures the cost of building and encoding a response of `/api/info` for a fleet of idle drones.
+
+- `full`: A full response, as to a newly opened page.
+- `poll`: A poll with `since` when nothing has changed, as most polls of an idle fleet are.
+- `reference`: Building the record of every drone with `toJSON()` and encoding them all with `json`, which every
+response used to do, as a lower bound of the cost of a response without the encoded records of `StateStore`.
+The tick lag of every drone changes before each run, as it does on every cycle.
+
+Usage (from the `be` directory):
+```bash
+python3 -m benchmarks.info_encoding --drones 100 1000 10000
+```
+"""
+import argparse
+import json
+from time import perf_counter
+
+from constants import HOME_POSITION
+from drone_utils import DroneId, DroneMode, DroneState
+from maplib import LatLon
+from mission_utils import Mission
+from state_store import StateStore, encode_info
+
+N_REQUESTS = 20
+
+def make_fleet(n_drones: int) -> dict:
+    drone_states = {DroneId(i): DroneState(i) for i in range(n_drones)}
+    for i, drone_state in drone_states.items():
+        drone_state._mode = DroneMode.IDLE
+        drone_state._position = LatLon(HOME_POSITION.lat + i * 1e-6, HOME_POSITION.lon)
+    return drone_states
+
+def time_requests(drone_states: dict, request) -> float:
+    """ Returns the mean time of a request, in seconds, with the tick lags changed once before. """
+    for drone_state in drone_states.values():
+        drone_state._tick_lag += 0.001
+    start = perf_counter()
+    for _ in range(N_REQUESTS):
+        request()
+    return (perf_counter() - start) / N_REQUESTS
+
+def bench(n_drones: int) -> tuple[float, float, float]:
+    """ Returns the mean time, in seconds, of a full response, an unchanged poll and the reference. """
+    drone_states = make_fleet(n_drones)
+    store = StateStore(Mission(), drone_states)
+    seq = store.info()["seq"]
+    full = time_requests(drone_states, lambda: encode_info(store.info()))
+    poll = time_requests(drone_states, lambda: encode_info(store.info(seq)))
+    reference = time_requests(drone_states, lambda: json.dumps(
+        {drone_id: drone_state.toJSON(include_simulated_path=False) for drone_id, drone_state in drone_states.items()}))
+    return full, poll, reference
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--drones", type=int, nargs="+", default=[100, 1000, 10000], help="Number of drones")
+    args = parser.parse_args(args)
+
+    print(f"{'drones':>6} {'full (ms)':>10} {'poll (ms)':>10} {'reference (ms)':>15}")
+    for n_drones in args.drones:
+        full, poll, reference = bench(n_drones)
+        print(f"{n_drones:>6} {full * 1e3:>10.2f} {poll * 1e3:>10.2f} {reference * 1e3:>15.2f}")
+
+if __name__ == "__main__":
+    main()
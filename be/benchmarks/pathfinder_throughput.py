@@ -0,0 +1,93 @@
+"""
+pathfinder_throughput:
+Benchmarks the step throughput of `BayesianHexSearch` for clusters of different sizes.
+
+Usage (from the `be` directory):
+```bash
+python3 -m benchmarks.pathfinder_throughput --rings 20 50 100 --steps 1000
+```
+"""
+import argparse
+import random
+from time import perf_counter
+
+import h3
+import numpy as np
+
+from maplib import LatLon
+from pathfinder.pathfinder import DEFAULT_RESOLUTION, PROBABILITY_DECAY, BayesianHexSearch, init_empty_prob_map, update_prob_map_w_hotspots, update_probability_map
+
+CENTRE = LatLon(1.3410058770769826, 103.96272668990389)
+N_HOTSPOTS = 10
+
+def build_map(n_rings: int, seed: int = 0):
+    """ Builds a probability map of `n_rings` around `CENTRE`, with hotspots scattered within the cluster. """
+    rng = random.Random(seed)
+    centre_hex = h3.geo_to_h3(CENTRE.lat, CENTRE.lon, DEFAULT_RESOLUTION)
+    cells = sorted(h3.k_ring(centre_hex, n_rings*2//3))
+    hotspots = [h3.h3_to_geo(cell) for cell in rng.sample(cells, N_HOTSPOTS)]
+
+    prob_map = init_empty_prob_map(CENTRE, n_rings)
+    return update_prob_map_w_hotspots(prob_map, hotspots)
+
+def bench_steps(n_rings: int, n_steps: int) -> float:
+    """ Returns the number of pathfinder steps (next step + Bayesian update) per second. """
+    prob_map = build_map(n_rings)
+    pathfinder = BayesianHexSearch(DEFAULT_RESOLUTION, (CENTRE.lat, CENTRE.lon))
+    cur_pos = (CENTRE.lat, CENTRE.lon)
+
+    start = perf_counter()
+    for _ in range(n_steps):
+        cur_pos = pathfinder.find_next_step(cur_pos, prob_map)
+        update_probability_map(prob_map, cur_pos, PROBABILITY_DECAY)
+    return n_steps / (perf_counter() - start)
+
+def bench_argmax(n_rings: int, n_queries: int) -> tuple[float, float, float]:
+    """
+    Returns the time taken (in microseconds) per argmax query after a single-cell update, for:
+    - A full scan over a dictionary, as done previously
+    - A full scan over the probability vector, with `np.argmax`
+    - `ProbabilityMap.argmax_slot()`, after a Bayesian update
+    """
+    prob_map = build_map(n_rings)
+    prob_dict = prob_map.to_dict()
+    slots = np.random.default_rng(0).integers(len(prob_map), size=n_queries)
+
+    start = perf_counter()
+    for slot in slots:
+        prob_dict[prob_map.hexes[slot]] *= 1 - PROBABILITY_DECAY
+        max(prob_dict, key=lambda key: prob_dict[key])
+    t_dict = perf_counter() - start
+
+    weights = prob_map.probabilities()
+    start = perf_counter()
+    for slot in slots:
+        weights[slot] *= 1 - PROBABILITY_DECAY
+        np.argmax(weights)
+    t_scan = perf_counter() - start
+
+    prob_map.argmax_slot()  # The order of the prior is computed on the first query
+    start = perf_counter()
+    for slot in slots:
+        prob_map.bayes_update(int(slot), PROBABILITY_DECAY)
+        prob_map.argmax_slot()
+    t_map = perf_counter() - start
+
+    return tuple(t * 1e6 / n_queries for t in (t_dict, t_scan, t_map))
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rings", type=int, nargs="+", default=[20, 50, 100], help="Number of rings in the cluster")
+    parser.add_argument("--steps", type=int, default=1000, help="Number of pathfinder steps to run")
+    parser.add_argument("--queries", type=int, default=200, help="Number of argmax queries to run")
+    args = parser.parse_args(args)
+
+    print(f"{'rings':>5} {'hexes':>7} {'steps/s':>9} {'dict max (us)':>14} {'np.argmax (us)':>15} {'map (us)':>10}")
+    for n_rings in args.rings:
+        n_hexes = 3*n_rings*(n_rings+1) + 1
+        steps_per_s = bench_steps(n_rings, args.steps)
+        t_dict, t_scan, t_map = bench_argmax(n_rings, args.queries)
+        print(f"{n_rings:>5} {n_hexes:>7} {steps_per_s:>9.0f} {t_dict:>14.1f} {t_scan:>15.1f} {t_map:>10.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+server_load:
+Measures the latency and throughput of the web server under concurrent clients, for each `ServerMode`.
+
+The server runs in its own process, with a real-time `DroneSystem` whose drones are moved by the commands of the
+clients. Each client thread holds a keep-alive connection and sends, for the duration of the run:
+- `info`: Polls of `/api/info?since=<seq>&epoch=<epoch>`, as the web client does, most of the time.
+- `info_full`: Full `/api/info` requests, as from a newly opened page, a fraction `FULL_INFO_FRACTION` of the time.
+- `moveto`: `/api/action/moveto` commands to a random drone, a fraction `MOVETO_FRACTION` of the time.
+
+Usage (from the `be` directory):
+```bash
+python3 -m benchmarks.server_load --servers debug threaded waitress --clients 16 --drones 100
+```
+"""
+import argparse
+import http.client
+import json
+import logging
+import multiprocessing
+import os
+import random
+import sys
+import threading
+from collections import defaultdict
+from queue import Queue
+from time import perf_counter, sleep
+
+import numpy as np
+
+from constants import HOME_POSITION
+from drone_utils import DroneId, DroneState
+from fake_drone_system import DroneSystem
+from mission_control_webserver import SERVER_HOST, SERVER_THREADS, MCWebServer, ServerMode
+from mission_utils import Mission
+
+PORT = 5050                 # Kept apart from the default port, so that a running server is not hit
+DURATION = 10.0             # Seconds of load per server
+FULL_INFO_FRACTION = 0.05   # Fraction of requests that are full `/api/info` requests
+MOVETO_FRACTION = 0.2       # Fraction of requests that are `/api/action/moveto` commands
+SPREAD = 0.005              # Spread of move targets around HOME_POSITION, in degrees
+
+def serve(mode: ServerMode, n_drones: int, threads: int):
+    """ Runs the server with a simulated fleet, until the process is terminated. """
+    # The drones print every command they receive
+    sys.stdout = open(os.devnull, "w")
+    logging.disable()
+    mission = Mission()
+    drone_states = {DroneId(i): DroneState(i) for i in range(n_drones)}
+    commands = Queue()
+    drone_sys = DroneSystem(drone_states, HOME_POSITION)
+    drone_sys.start()
+    drone_sys.connect_drones()
+
+    def forward_commands():
+        while True:
+            drone_sys.add_command(*commands.get())
+    threading.Thread(target=forward_commands, daemon=True).start()
+
+    MCWebServer(mission, drone_states, commands, Queue()).run(mode, SERVER_HOST, PORT, threads)
+
+def wait_for_server(timeout: float = 30.0):
+    deadline = perf_counter() + timeout
+    while True:
+        try:
+            conn = http.client.HTTPConnection(SERVER_HOST, PORT, timeout=1)
+            conn.request("GET", "/api/info")
+            conn.getresponse().read()
+            conn.close()
+            return
+        except OSError:
+            if perf_counter() > deadline:
+                raise
+            sleep(0.1)
+
+def client(n_drones: int, seed: int, end: float, latencies: dict, errors: list):
+    """ Sends requests until `end`, recording the latency of each by kind. """
+    rng = random.Random(seed)
+    conn = http.client.HTTPConnection(SERVER_HOST, PORT, timeout=30)
+    seq = epoch = None
+    while perf_counter() < end:
+        draw = rng.random()
+        if draw < MOVETO_FRACTION:
+            kind = "moveto"
+            lat = HOME_POSITION.lat + rng.uniform(-SPREAD, SPREAD)
+            lon = HOME_POSITION.lon + rng.uniform(-SPREAD, SPREAD)
+            url = f"/api/action/moveto?drone_id={rng.randrange(n_drones)}&lat={lat}&lon={lon}"
+        elif draw < MOVETO_FRACTION + FULL_INFO_FRACTION or seq is None:
+            kind, url = "info_full", "/api/info"
+        else:
+            kind, url = "info", f"/api/info?since={seq}&epoch={epoch}"
+        start = perf_counter()
+        try:
+            conn.request("GET", url)
+            response = conn.getresponse()
+            body = response.read()
+        except (OSError, http.client.HTTPException) as e:
+            errors.append(repr(e))
+            conn.close()
+            conn = http.client.HTTPConnection(SERVER_HOST, PORT, timeout=30)
+            continue
+        latencies[kind].append(perf_counter() - start)
+        if response.status != 200:
+            errors.append(f"{url}: {response.status}")
+        elif kind.startswith("info"):
+            info = json.loads(body)
+            seq, epoch = info["seq"], info["epoch"]
+    conn.close()
+
+def bench(mode: ServerMode, n_clients: int, n_drones: int, duration: float, threads: int) -> tuple[dict, list, float]:
+    """ Returns the latencies of each kind of request, the errors, and the number of requests per second. """
+    server = multiprocessing.get_context("spawn").Process(target=serve, args=(mode, n_drones, threads), daemon=True)
+    server.start()
+    try:
+        wait_for_server()
+        latencies = defaultdict(list)
+        errors = []
+        end = perf_counter() + duration
+        clients = [threading.Thread(target=client, args=(n_drones, seed, end, latencies, errors)) for seed in range(n_clients)]
+        for thread in clients:
+            thread.start()
+        for thread in clients:
+            thread.join()
+    finally:
+        server.terminate()
+        server.join()
+    n_requests = sum(len(times) for times in latencies.values())
+    return latencies, errors, n_requests / duration
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--servers", nargs="+", choices=[mode.name.lower() for mode in ServerMode],
+        default=[mode.name.lower() for mode in ServerMode], help="Server modes to measure")
+    parser.add_argument("--clients", type=int, default=16, help="Number of concurrent clients")
+    parser.add_argument("--drones", type=int, default=100, help="Number of simulated drones")
+    parser.add_argument("--duration", type=float, default=DURATION, help="Seconds of load per server")
+    parser.add_argument("--threads", type=int, default=SERVER_THREADS, help="Worker threads of the waitress server")
+    args = parser.parse_args(args)
+
+    print(f"{'server':>8} {'request':>9} {'count':>7} {'p50 (ms)':>9} {'p99 (ms)':>9} {'req/s':>7} {'errors':>6}")
+    for name in args.servers:
+        latencies, errors, throughput = bench(ServerMode[name.upper()], args.clients, args.drones, args.duration, args.threads)
+        for kind in ("info", "info_full", "moveto"):
+            times = np.array(latencies[kind]) * 1e3
+            if len(times) == 0:
+                continue
+            print(f"{name:>8} {kind:>9} {len(times):>7} {np.percentile(times, 50):>9.2f} {np.percentile(times, 99):>9.2f} {'':>7} {'':>6}")
+        print(f"{name:>8} {'all':>9} {sum(map(len, latencies.values())):>7} {'':>9} {'':>9} {throughput:>7.0f} {len(errors):>6}")
+        for error in errors[:5]:
+            print(f"{'':>8} {error}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+tick_lag:
+Measures how much a burst of SEARCH_SECTOR commands delays the real-time cycles of the drones that were not commanded.
+
+A fleet of drones is moved towards random targets, and a few of them are sent SEARCH_SECTOR commands to distinct
+clusters (with cold geometry) on the same cycle. The fleet is run for a few cycles:
+- `serial`: Commands are handled on the cycle thread between steps of the fleet, as `DroneSystem` used to.
+- `lanes`: Commands are handled on the worker pool of a `FleetScheduler`.
+The tick lag of a drone is the time between when a cycle was due and when it was applied to the drone.
+
+Usage (from the `be` directory):
+```bash
+python3 -m benchmarks.tick_lag --drones 1000 --commands 20
+```
+"""
+import argparse
+import random
+from queue import Queue
+from time import perf_counter, sleep
+
+import numpy as np
+
+from constants import HOME_POSITION
+from drone_utils import DroneCommand_MOVE_TO, DroneCommand_SEARCH_SECTOR, DroneId, DroneState, PathAlgo
+from fake_drone_system import Drone, FleetKinematics, FleetScheduler
+from maplib import LatLon
+from pathfinder.pathfinder import _simulation_pool
+
+SPREAD = 0.005  # Spread of targets and cluster centres around HOME_POSITION, in degrees
+N_HOTSPOTS = 10
+HOTSPOT_SPREAD = 0.0002  # Spread of hotspots around the centre of their cluster, in degrees
+N_CYCLES = 10
+CYCLE_INTERVAL = 0.1    # Shorter than `DRONE_CYCLE_INTERVAL`, to keep the benchmark short
+
+def random_pos(rng: random.Random) -> LatLon:
+    return LatLon(HOME_POSITION.lat + rng.uniform(-SPREAD, SPREAD), HOME_POSITION.lon + rng.uniform(-SPREAD, SPREAD))
+
+def make_fleet(n_drones: int, rng: random.Random) -> dict:
+    drone_states = {DroneId(i): DroneState(i) for i in range(n_drones)}
+    drones = {drone_id: Drone(drone_id, drone_states, HOME_POSITION) for drone_id in drone_states}
+    for drone in drones.values():
+        drone.connect()
+        drone.handle_command(DroneCommand_MOVE_TO(random_pos(rng)))
+    return drones
+
+def make_commands(n_commands: int, rng: random.Random) -> list:
+    commands = []
+    for i in range(n_commands):
+        centre = random_pos(rng)
+        hotspots = [(centre.lat + rng.uniform(-HOTSPOT_SPREAD, HOTSPOT_SPREAD), centre.lon + rng.uniform(-HOTSPOT_SPREAD, HOTSPOT_SPREAD)) for _ in range(N_HOTSPOTS)]
+        commands.append((DroneId(i), DroneCommand_SEARCH_SECTOR(centre, hotspots, PathAlgo.BAYES)))
+    return commands
+
+def run_serial(drones: dict, commands: list) -> np.ndarray:
+    """ Returns the tick lag of each drone on each cycle, of shape (cycles, drones), handling commands on the cycle thread. """
+    fleet = FleetKinematics(drones)
+    lags = []
+    due = perf_counter()
+    for cycle in range(N_CYCLES):
+        fleet.step()
+        lags.append(np.full(len(drones), perf_counter() - due))
+        if cycle == 1:
+            for drone_id, command in commands:
+                drones[drone_id].handle_command(command)
+                fleet.sync(drone_id)
+        due += CYCLE_INTERVAL
+        sleep(max(0.0, due - perf_counter()))
+    return np.array(lags)
+
+def run_lanes(drones: dict, commands: list) -> np.ndarray:
+    """ Returns the tick lag of each drone on each cycle, of shape (cycles, drones), handling commands on the lanes. """
+    queue = Queue()
+    scheduler = FleetScheduler(drones, queue, interval=CYCLE_INTERVAL)
+    lags = []
+    due = perf_counter()
+    for cycle in range(N_CYCLES):
+        if cycle == 1:
+            for drone_id, command in commands:
+                queue.put((drone_id, command))
+        scheduler.tick(due)
+        lags.append(scheduler.tick_lags.copy())
+        due += CYCLE_INTERVAL
+        sleep(max(0.0, due - perf_counter()))
+    return np.array(lags)
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--drones", type=int, default=1000, help="Number of drones")
+    parser.add_argument("--commands", type=int, default=20, help="Number of drones sent a SEARCH_SECTOR command")
+    args = parser.parse_args(args)
+
+    print(f"{'scheduling':>10} {'others p50 (ms)':>16} {'others max (ms)':>16} {'commanded max (ms)':>19}")
+    _simulation_pool().submit(int).result()    # Start the simulation workers, which both runs share
+    for seed, (name, run) in enumerate((("serial", run_serial), ("lanes", run_lanes))):
+        # Each run searches its own clusters, so that both build their geometry
+        rng = random.Random(seed)
+        drones = make_fleet(args.drones, rng)
+        commands = make_commands(args.commands, rng)
+        lags = run(drones, commands) * 1e3
+        others, commanded = lags[:, args.commands:], lags[:, :args.commands]
+        print(f"{name:>10} {np.median(others):>16.2f} {others.max():>16.2f} {commanded.max():>19.2f}")
+
+if __name__ == "__main__":
+    main()
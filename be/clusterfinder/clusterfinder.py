@@ -1,5 +1,14 @@
 from typing import Dict
+
+import numpy as np
+from pymap3d import geodetic2ecef, geodetic2enu
+from scipy.spatial import ConvexHull, QhullError, cKDTree
+
 from .interface import Cluster, ClusterFinder
+from .maplib import distances
+
+MAX_BATCH_PAIRS = 1_000_000     # Candidate neighbour pairs whose distances DBSCAN computes at once
+DENSITY_SAMPLE = 256            # Points sampled by DBSCAN to estimate the number of candidates per point
 
 # DBScan ClusterFinder
 
@@ -7,103 +16,311 @@ from .interface import Cluster, ClusterFinder
 class DBSCANClusterFinder(ClusterFinder):
     """
     DBSCAN Clustering Object using the DBSCAN algorithm.
+    - Points are projected once to ECEF coordinates and indexed with a KD-tree. As the straight-line (chord) distance
+    between two points is never longer than the distance along the ellipsoid, a range query on the KD-tree returns
+    every possible neighbour. The Vincenty distance is only computed for the candidates whose chord is too close to
+    the maximum gap to decide (see `chord_tolerance()`).
+    - Neighbours are computed when they are needed, for chunks of points at once: the next points of the dataset,
+    and the next points queued by the expansion of a cluster. Chunks hold up to `batch_size` points, fewer in dense
+    data so that about `MAX_BATCH_PAIRS` candidate pairs are held at once (as estimated from the previous chunk), and the neighbours of each point are
+    dropped once it is visited, so memory does not grow with the total number of neighbour pairs.
 
     Args:
     - max_gap (int): The maximum distance (in km) between two points to be considered neighbors.
     - min_pts (int): The minimum number of neighbors required to be considered a core point.
     """
 
-    def __init__(self, dataset, max_gap=1, min_pts=2):
+    def __init__(self, dataset, max_gap=1, min_pts=2, batch_size=4096):
         super().__init__(dataset)
         self.max_gap = max_gap
         self.min_pts = min_pts
+        self.batch_size = batch_size
+        self._tree = None
+        self._pending = {}      # Neighbours computed for points that have not been visited yet, by slot
+        self._queued = None     # Number of the last cluster whose expansion queued each point
+        self._candidates_per_point = 1.0    # Mean number of candidate neighbours in the last chunk
+
+    def build_index(self):
+        """
+        Builds the spatial index over the dataset.
+        """
+        self._lats = np.array([point.latlon.lat for point in self.dataset], dtype=np.float64)
+        self._lons = np.array([point.latlon.lon for point in self.dataset], dtype=np.float64)
+        self._ecef = np.column_stack(geodetic2ecef(self._lats, self._lons, 0)) if len(self.dataset) else np.zeros((0, 3))
+        self._tree = cKDTree(self._ecef)
+        self._slots = {id(point): slot for slot, point in enumerate(self.dataset)}
+
+    def _neighbors_of(self, slots):
+        """
+        Returns the slots of all points within eps-distance from each of the points in the given slots, in dataset
+        order, as a dictionary by slot.
+        """
+        slots = np.asarray(slots, dtype=np.int64)
+        if len(slots) == 0:
+            return {}
+        radius = self.max_gap * 1000
+        candidates = self._tree.query_ball_point(self._ecef[slots], r=radius, return_sorted=True)
+        counts = np.fromiter(map(len, candidates), dtype=np.int64, count=len(slots))
+        self._candidates_per_point = float(counts.mean())
+        positions = np.repeat(np.arange(len(slots)), counts)
+        sources = slots[positions]
+        targets = np.concatenate([np.asarray(c, dtype=np.int64) for c in candidates])
+
+        # Candidates whose chord is clearly shorter than eps are neighbours, the others are settled with Vincenty
+        chords = np.linalg.norm(self._ecef[sources] - self._ecef[targets], axis=1)
+        within = chords * (1 + chord_tolerance(chords)) < radius
+        undecided = np.flatnonzero(~within)
+        if len(undecided):
+            s, t = sources[undecided], targets[undecided]
+            within[undecided] = distances(self._lats[s], self._lons[s], self._lats[t], self._lons[t]) / 1000 < self.max_gap
+        n_within = np.bincount(positions[within], minlength=len(slots))
+        return dict(zip(slots.tolist(), np.split(targets[within], np.cumsum(n_within)[:-1])))
+
+    def _chunk_size(self):
+        """ Returns the number of points whose neighbours are computed together. """
+        return int(min(self.batch_size, max(1, MAX_BATCH_PAIRS // max(self._candidates_per_point, 1))))
+
+    def _visit(self, slots):
+        """
+        Marks the points in the given slots as visited, and returns their neighbours by slot.
+        """
+        missing = [slot for slot in slots if slot not in self._pending]
+        if missing:
+            self._pending.update(self._neighbors_of(missing))
+        for slot in slots:
+            self.dataset[slot].visited = True
+        return {slot: self._pending.pop(slot) for slot in slots}
+
+    def _region_query(self, slot):
+        """
+        Returns the slots of all points within eps-distance from the point in the given slot, in dataset order.
+        """
+        if slot in self._pending:
+            return self._pending[slot]
+        return self._neighbors_of([slot])[slot]
 
     def region_query(self, point):
         """
         Returns all points within eps-distance from the given point in the dataset.
         """
-        neighbors = []
-        for candidate_point in self.dataset:
-            if point.distance(candidate_point) < self.max_gap:
-                neighbors.append(candidate_point)
-        return neighbors
+        if self._tree is None:
+            self.build_index()
+        return [self.dataset[slot] for slot in self._region_query(self._slots[id(point)])]
 
-    def expand_cluster(self, point, neighbors):
+    def expand_cluster(self, slot, neighbors):
         """
-        Expands the cluster of the given point and its neighbors.
+        Expands the cluster of the point in the given slot and its neighbors (as slots).
         """
+        point = self.dataset[slot]
         point.cluster = self.cluster_count
         self.clusters[self.cluster_count] = [point]
+        if self._queued is None:
+            self._queued = np.zeros(len(self.dataset), dtype=np.int64)
+
+        # Each point is queued at most once per cluster
+        self._queued[neighbors] = self.cluster_count
+        queue = list(neighbors)
         i = 0
-        while i < len(neighbors):
-            neighbor = neighbors[i]
-            if not neighbor.visited:
-                neighbor.visited = True
-                new_neighbors = self.region_query(neighbor)
-                if len(new_neighbors) >= self.min_pts:
-                    neighbors += new_neighbors
-            if neighbor.cluster is None:
-                neighbor.cluster = self.cluster_count
-                self.clusters[self.cluster_count].append(neighbor)
-            i += 1
+        while i < len(queue):
+            # The unvisited points of the next chunk of the queue are visited together, in queue order
+            chunk = queue[i:i+self._chunk_size()]
+            i += len(chunk)
+            visited = self._visit([slot for slot in chunk if not self.dataset[slot].visited])
+            for neighbor_slot in chunk:
+                neighbor = self.dataset[neighbor_slot]
+                new_neighbors = visited.get(neighbor_slot)
+                if new_neighbors is not None and len(new_neighbors) >= self.min_pts:
+                    new_neighbors = new_neighbors[self._queued[new_neighbors] != self.cluster_count]
+                    self._queued[new_neighbors] = self.cluster_count
+                    queue += new_neighbors.tolist()
+                if neighbor.cluster is None:
+                    neighbor.cluster = self.cluster_count
+                    self.clusters[self.cluster_count].append(neighbor)
 
     def fit(self):
         """
         Run the DBSCAN clustering algorithm.
         """
-        for point in self.dataset:
-            if not point.visited:
-                point.visited = True
-                neighbors = self.region_query(point)
+        self.build_index()
+        self._queued = np.zeros(len(self.dataset), dtype=np.int64)
+        if len(self.dataset):
+            # Size the first chunk from the density of a sample of the points
+            sample = np.linspace(0, len(self.dataset) - 1, min(len(self.dataset), DENSITY_SAMPLE)).astype(np.int64)
+            counts = self._tree.query_ball_point(self._ecef[sample], r=self.max_gap*1000, return_length=True)
+            self._candidates_per_point = float(counts.mean())
+        start = 0
+        while start < len(self.dataset):
+            # Neighbours are computed for the unvisited points of the batch together, and used as each is reached
+            end = min(start+self._chunk_size(), len(self.dataset))
+            batch = [slot for slot in range(start, end) if not self.dataset[slot].visited]
+            start = end
+            self._pending.update(self._neighbors_of(batch))
+            for slot in batch:
+                point = self.dataset[slot]
+                if point.visited:
+                    continue
+                neighbors = self._visit([slot])[slot]
                 if len(neighbors) < self.min_pts:
                     point.is_noise = True
                 else:
                     self.cluster_count += 1
-                    self.expand_cluster(point, neighbors)
+                    self.expand_cluster(slot, neighbors)
         return self.clusters
 
 
 # DIANA ClusterFinder
 
+HULL_MIN_POINTS = 16        # Clusters up to this size are searched exhaustively for their farthest pair
+MIN_EARTH_RADIUS = 6.3e6    # Lower bound on the radius of curvature of the WGS84 ellipsoid, in m
+
+def chord_tolerance(chord):
+    """
+    Relative tolerance below which the chord lengths of two pairs of points, each up to `chord` metres apart,
+    do not decide which pair is further apart along the ellipsoid.
+    - The ratio of the geodesic to the chord length is 1 + (c/R)^2/24 + ... for a chord of length c on a surface
+    of radius R. Twice that bound is used, which is about 2e-8 for a chord of 10 km.
+    """
+    return (chord / MIN_EARTH_RADIUS)**2 / 12 + 1e-12
 
 class DIANA_Cluster(Cluster):
-    def __init__(self, points):
+    """
+    Cluster of points split by the DIANA algorithm.
+    - The coordinates of the points are held as arrays: geodetic (lat, lon), ECEF, and (east, north) in a local
+    tangent plane. Sub-clusters index into the arrays of their parent, so points are only converted once.
+    - The farthest pair of points is searched among the vertices of the convex hull of the points in the tangent
+    plane, so only O(h^2) pairs are compared for a hull of h vertices instead of O(n^2).
+    - Distances are compared by chord length in ECEF coordinates, and Vincenty distances are only computed when two
+    chord lengths are too close to decide the comparison (see `chord_tolerance()`), so the results are the same as
+    comparing Vincenty distances.
+    """
+    def __init__(self, points, coords=None):
+        """
+        - `points`: Points in the cluster.
+        - `coords`: Coordinates of the points, as computed by `cluster_coordinates()`. Computed if not given.
+        """
         self.hotspots = points
+        self.coords = coords if coords is not None else cluster_coordinates(points)
+        self.lats, self.lons, self.ecef, self.plane = self.coords
+        self._farthest_slots = None
+
+    def farthest_pair_candidates(self):
+        """
+        Returns the slots of the points that can be part of the farthest pair, in ascending order.
+        """
+        n = len(self.hotspots)
+        if n <= HULL_MIN_POINTS:
+            return np.arange(n)
+        try:
+            return np.sort(ConvexHull(self.plane).vertices)
+        except QhullError:
+            # The points are collinear (or coincident), so the farthest pair are extremes along an axis
+            extremes = [self.plane[:, 0].argmin(), self.plane[:, 0].argmax(),
+                        self.plane[:, 1].argmin(), self.plane[:, 1].argmax()]
+            return np.unique(extremes)
+
+    def farthest_pair(self):
+        """
+        Finds the two points furthest apart in the cluster. Returns their slots and chord length in metres,
+        or (None, 0) if all points in the cluster coincide.
+        """
+        candidates = self.farthest_pair_candidates()
+        i, j = np.triu_indices(len(candidates), k=1)
+        i, j = candidates[i], candidates[j]
+        chords = np.linalg.norm(self.ecef[i] - self.ecef[j], axis=1)
+        if len(chords) == 0 or chords.max() <= 0:
+            return None, 0
+
+        # Only the pairs whose chord is within tolerance of the longest one can be the farthest pair
+        best = int(chords.argmax())
+        close = np.flatnonzero(chords >= chords[best] * (1 - chord_tolerance(chords[best])))
+        if len(close) > 1:
+            dist_km = distances(self.lats[i[close]], self.lons[i[close]], self.lats[j[close]], self.lons[j[close]]) / 1000
+            best = int(close[dist_km.argmax()])
+        self._farthest_slots = (int(i[best]), int(j[best]))
+        return self._farthest_slots, float(chords[best])
 
     def longest_distance(self):
         """
         Finds the maximum distance between two points in a cluster and returns the two points
         """
-        max_distance = 0
-        A, B = None, None
-        for i in range(len(self.hotspots)):
-            for j in range(i+1, len(self.hotspots)):
-                d = self.hotspots[i].distance(self.hotspots[j])
-                if d > max_distance:
-                    max_distance = d
-                    A, B = self.hotspots[i], self.hotspots[j]
-        return max_distance, [A, B]
+        slots, _ = self.farthest_pair()
+        if slots is None:
+            return 0, [None, None]
+        a, b = slots
+        distance = float(distances(self.lats[a], self.lons[a], self.lats[b], self.lons[b]) / 1000)
+        return distance, [self.hotspots[a], self.hotspots[b]]
+
+    def exceeds(self, threshold):
+        """
+        Returns the farthest pair of points if they are more than `threshold` km apart, and None otherwise.
+        - The Vincenty distance is only computed if the chord length of the pair is too close to the threshold
+        to decide.
+        """
+        slots, chord = self.farthest_pair()
+        if slots is None:
+            return None
+        threshold_m = threshold * 1000
+        if chord * (1 + chord_tolerance(chord)) <= threshold_m:
+            return None
+        if chord <= threshold_m:
+            a, b = slots
+            if float(distances(self.lats[a], self.lons[a], self.lats[b], self.lons[b]) / 1000) <= threshold:
+                return None
+        return [self.hotspots[slot] for slot in slots]
+
+    def slot_of(self, point):
+        """ Returns the slot of a point in the cluster. """
+        if self._farthest_slots is not None:
+            for slot in self._farthest_slots:
+                if self.hotspots[slot] is point:
+                    return slot
+        return next(slot for slot, other in enumerate(self.hotspots) if other is point)
 
     def split(self, A, B):
-        # Find two points with maximum dissimilarity
-        cluster_a = [A]
-        cluster_b = [B]
+        # Assign each point to the closer of the two points with maximum dissimilarity
+        slot_a, slot_b = self.slot_of(A), self.slot_of(B)
+        chord_a = np.linalg.norm(self.ecef - self.ecef[slot_a], axis=1)
+        chord_b = np.linalg.norm(self.ecef - self.ecef[slot_b], axis=1)
+        to_b = chord_a > chord_b
 
-        for i in range(len(self.hotspots)):
-            if self.hotspots[i] in (A, B):
-                pass
-            else:
-                if self.hotspots[i].distance(A) > self.hotspots[i].distance(B):
-                    cluster_b.append(self.hotspots[i])
-                else:
-                    cluster_a.append(self.hotspots[i])
+        # Settle the comparisons that are too close to call by chord length with Vincenty distances
+        longer = np.maximum(chord_a, chord_b)
+        undecided = np.flatnonzero(np.abs(chord_a - chord_b) <= longer * chord_tolerance(longer))
+        if len(undecided):
+            lats, lons = self.lats[undecided], self.lons[undecided]
+            to_b[undecided] = (distances(lats, lons, self.lats[slot_a], self.lons[slot_a])
+                               > distances(lats, lons, self.lats[slot_b], self.lons[slot_b]))
+        to_b[slot_a], to_b[slot_b] = False, True
 
-        return DIANA_Cluster(cluster_a), DIANA_Cluster(cluster_b)
+        # A and B lead their clusters, followed by the remaining points in order
+        others = np.ones(len(self.hotspots), dtype=bool)
+        others[[slot_a, slot_b]] = False
+        slots_a = np.concatenate([[slot_a], np.flatnonzero(others & ~to_b)])
+        slots_b = np.concatenate([[slot_b], np.flatnonzero(others & to_b)])
+        return self.subcluster(slots_a), self.subcluster(slots_b)
+
+    def subcluster(self, slots):
+        """ Returns the cluster of the points in the given slots. """
+        return DIANA_Cluster([self.hotspots[slot] for slot in slots], tuple(coord[slots] for coord in self.coords))
 
     def __str__(self):
         return f'''DIANA_Cluster:{[i.id for i in self.hotspots]}'''
 
 
+def cluster_coordinates(points):
+    """
+    Returns the coordinates of the given points as arrays (lats, lons, ecef, plane), where `ecef` is of shape (n, 3)
+    and `plane` holds the (east, north) coordinates in metres in the tangent plane at the first point.
+    """
+    lats = np.array([point.latlon.lat for point in points], dtype=np.float64)
+    lons = np.array([point.latlon.lon for point in points], dtype=np.float64)
+    if len(points) == 0:
+        return lats, lons, np.zeros((0, 3)), np.zeros((0, 2))
+    ecef = np.column_stack(geodetic2ecef(lats, lons, 0))
+    east, north, _ = geodetic2enu(lats, lons, 0, lats[0], lons[0], 0)
+    return lats, lons, ecef, np.column_stack([east, north])
+
+
 class DIANAClusterFinder(ClusterFinder):
     """
     DIANA Clustering Object using the DIANA algorithm.
@@ -124,8 +341,8 @@ class DIANAClusterFinder(ClusterFinder):
         clusters_to_split = [initial_cluster]
         while len(clusters_to_split) > 0:
             target_cluster = clusters_to_split.pop()
-            max_distance, furthest_pts = target_cluster.longest_distance()
-            if max_distance > self.threshold:
+            furthest_pts = target_cluster.exceeds(self.threshold)
+            if furthest_pts is not None:
                 clusters_to_split += target_cluster.split(
                     furthest_pts[0], furthest_pts[1])
             else:
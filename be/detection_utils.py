@@ -1,10 +1,20 @@
-
-
 import datetime
-from typing import Dict
+import json
+from bisect import bisect_left
+from collections import OrderedDict
+from queue import Queue
+from threading import Lock, Thread
+from typing import Dict, List
+
+import h3
+import h3.api.basic_int as h3_int
 
 from maplib import LatLon
 
+DETECTION_LOG_CAPACITY = 10_000  # Number of detections kept in memory
+DEDUP_RESOLUTION = 14  # H3 resolution of the cells within which repeated detections are merged, as searched by the drones
+DEDUP_WINDOW = datetime.timedelta(minutes=5)  # Repeated detections in a cell within this time are merged
+
 
 class DetectedEntity:
     """
@@ -23,4 +33,213 @@ class DetectedEntity:
             "drone_id": self.drone_id,
             "coordinates": self.coordinates.__dict__,  # Modify this according to how LatLon is implemented
             "time_found": self.time_found.isoformat()  # Convert datetime to ISO 8601 string
-        }
\ No newline at end of file
+        }
+
+
+class DetectionLog:
+    """
+    Bounded, time-indexed log of detections, fed from a queue by its own thread (see `start()`).
+
+    Detections are stored serialised, as by `DetectedEntity.to_dict()`, with:
+    - `id`: Sequence number of the detection in the log, starting from 1.
+    - `cell`: H3 index of the cell of the detection, at `DEDUP_RESOLUTION`.
+    - `count`, `last_seen`: Number of detections merged into this one, and when the latest of them was found.
+    - `rev`: Revision of the log at which the detection was added or last merged into.
+    A detection in the same cell as the latest detection there, within `dedup_window` of it, is merged into it.
+    `changed_since()` returns the detections added or merged into after a revision, for clients to update theirs.
+
+    Entries are not modified once they are in the log: merging into a detection replaces its entry with an updated
+    copy. The entries returned by the log can therefore be read after the lock is released, but must not be modified.
+
+    Only the latest `capacity` detections are kept in memory, in a ring buffer, so that adding a detection to a full
+    log takes constant time. Older detections are appended to the JSON lines file at `spill_path` if it is given,
+    and are dropped otherwise.
+
+    Detections are kept in order of ID, which is the order in which they were added, but a drone can report a
+    detection after others that were found later. Time queries bisect the running maximum of the times found, and
+    check the time of each detection within the latest lateness seen (`_max_lateness`) of the bounds.
+    """
+    def __init__(self, capacity: int = DETECTION_LOG_CAPACITY, spill_path: str = None,
+            dedup_window: datetime.timedelta = DEDUP_WINDOW):
+        self.capacity = capacity
+        self.spill_path = spill_path
+        self.dedup_window = dedup_window
+        self.last_id = 0
+        self.rev = 0                        # Incremented whenever a detection is added or merged into
+        self._evicted_rev = 0               # Latest revision of the detections evicted so far
+        self._changed: OrderedDict[int, Dict] = OrderedDict()   # Detections in memory by ID, in order of `rev`
+        self._first_id = 1                  # ID of the oldest detection in memory, at `_entries[_head]`
+        self._head = 0                      # Index of the oldest detection in the ring buffers
+        self._entries: List[Dict] = []      # Ring buffer of the detections, in order of ID from `_head`
+        self._found: List[float] = []       # Ring buffer of the POSIX time at which each detection was found
+        self._times: List[float] = []       # Ring buffer of the running maximum of `_found`, for bisection
+        self._last_time: float = None       # Latest of `_times`
+        self._max_lateness = 0.0            # Longest a detection has been added after a later one, in seconds
+        self._by_cell: Dict[int, Dict] = {}  # Latest detection of each cell, and when it was last seen
+        self._lock = Lock()
+        self._thread: Thread = None
+
+    def start(self, queue: Queue):
+        """ Starts a thread that adds every detection placed in `queue` to the log. """
+        def ingest():
+            while True:
+                self.add(queue.get())
+        self._thread = Thread(target=ingest, daemon=True)
+        self._thread.start()
+
+    def add(self, entity: DetectedEntity) -> Dict:
+        """ Adds a detection to the log, merging it with the latest detection in its cell if it is recent. Returns the entry. """
+        cell = None
+        if entity.coordinates is not None:
+            cell = h3_int.geo_to_h3(entity.coordinates.lat, entity.coordinates.lon, DEDUP_RESOLUTION)
+        with self._lock:
+            latest = self._by_cell.get(cell) if cell is not None else None
+            if latest is not None and entity.time_found - latest[1] <= self.dedup_window:
+                entry = dict(latest[0])
+                entry["count"] += 1
+                entry["last_seen"] = entity.time_found.isoformat()
+                self._touch(entry)
+                self._entries[self._slot(entry["id"] - self._first_id)] = entry
+                self._by_cell[cell] = (entry, entity.time_found)
+                return entry
+
+            self.last_id += 1
+            entry = entity.to_dict()
+            entry.update({
+                "id": self.last_id,
+                "cell": h3.h3_to_string(cell) if cell is not None else None,
+                "count": 1,
+                "last_seen": entry["time_found"],
+            })
+            self._touch(entry)
+            found = entity.time_found.timestamp()
+            self._last_time = max(found, self._last_time) if self._last_time is not None else found
+            self._max_lateness = max(self._max_lateness, self._last_time - found)
+            if len(self._entries) < self.capacity:
+                self._entries.append(entry)
+                self._found.append(found)
+                self._times.append(self._last_time)
+            else:
+                self._evict()
+                self._entries[self._head] = entry
+                self._found[self._head] = found
+                self._times[self._head] = self._last_time
+                self._head = (self._head + 1) % self.capacity
+            if cell is not None:
+                self._by_cell[cell] = (entry, entity.time_found)
+            return entry
+
+    def _slot(self, index: int) -> int:
+        """ Index in the ring buffers of the `index`th oldest detection in memory. """
+        return (self._head + index) % len(self._entries)
+
+    def _between(self, lo: int, hi: int) -> List[Dict]:
+        """ Returns the `lo`th to `hi`th (exclusive) oldest detections in memory. The lock must be held. """
+        if lo >= hi:
+            return []
+        size = len(self._entries)
+        start, end = self._head + lo, self._head + hi
+        if end <= size:
+            return self._entries[start:end]
+        if start >= size:
+            return self._entries[start - size:end - size]
+        return self._entries[start:] + self._entries[:end - size]
+
+    def _bisect_time(self, time: float) -> int:
+        """
+        Returns the index, from the oldest detection in memory, of the first detection whose running maximum of the
+        times found is at or after POSIX time `time`. The ring buffer holds two sorted runs, the older from `_head`
+        to the end. The lock must be held.
+        """
+        head = self._head
+        if head == 0:
+            return bisect_left(self._times, time)
+        if time <= self._times[-1]:
+            return bisect_left(self._times, time, head) - head
+        return len(self._times) - head + bisect_left(self._times, time, 0, head)
+
+    def _touch(self, entry: Dict):
+        """ Marks a new or updated entry as changed at a new revision, before it is stored. The lock must be held. """
+        self.rev += 1
+        entry["rev"] = self.rev
+        self._changed[entry["id"]] = entry
+        self._changed.move_to_end(entry["id"])
+
+    def _evict(self):
+        """
+        Removes the oldest detection from memory, spilling it to disk if enabled. Its place in the ring buffers is
+        then reused by the caller. The lock must be held.
+        """
+        entry = self._entries[self._head]
+        self._first_id += 1
+        del self._changed[entry["id"]]
+        self._evicted_rev = max(self._evicted_rev, entry["rev"])
+        cell = h3.string_to_h3(entry["cell"]) if entry["cell"] is not None else None
+        if cell in self._by_cell and self._by_cell[cell][0] is entry:
+            del self._by_cell[cell]
+        if self.spill_path is not None:
+            with open(self.spill_path, "a") as f:
+                f.write(json.dumps(entry) + "\n")
+
+    @property
+    def first_id(self) -> int:
+        """ ID of the oldest detection in memory. """
+        return self._first_id
+
+    def changed_since(self, rev: int) -> List[Dict]:
+        """
+        Returns the detections added or merged into after revision `rev`, in order of revision, or None if some of
+        them have been evicted since.
+        """
+        with self._lock:
+            if rev < self._evicted_rev:
+                return None
+            changed = []
+            for entry in reversed(self._changed.values()):
+                if entry["rev"] <= rev:
+                    break
+                changed.append(entry)
+            return changed[::-1]
+
+    def recent(self, n_entries: int) -> List[Dict]:
+        """ Returns the latest `n_entries` detections. """
+        with self._lock:
+            size = len(self._entries)
+            return self._between(max(size - n_entries, 0), size)
+
+    def query(self, start: datetime.datetime = None, end: datetime.datetime = None, after_id: int = 0,
+            limit: int = None) -> List[Dict]:
+        """
+        Returns the detections in memory found from `start` (inclusive) to `end` (exclusive), by their `time_found`
+        even if they were added out of order, with an ID after `after_id`, in order of ID. Pages of `limit`
+        detections can be read by passing the ID of the last detection of the previous page as `after_id`.
+        """
+        start_time = start.timestamp() if start is not None else None
+        end_time = end.timestamp() if end is not None else None
+        with self._lock:
+            # Detections found before `start` are all before `lo`, as the running maximum is at least the time found
+            lo = max(after_id + 1 - self._first_id, 0)
+            if start_time is not None:
+                lo = max(lo, self._bisect_time(start_time))
+            if end_time is None:
+                hi = len(self._entries)
+            else:
+                hi = self._bisect_time(end_time + self._max_lateness)
+            if self._max_lateness == 0:
+                # Every detection was added in order of time found, so the range is exact
+                if limit is not None:
+                    hi = min(hi, lo + limit)
+                return self._between(lo, hi)
+
+            detections = []
+            for index in range(lo, hi):
+                slot = self._slot(index)
+                found = self._found[slot]
+                if (start_time is None or found >= start_time) and (end_time is None or found < end_time):
+                    detections.append(self._entries[slot])
+                    if len(detections) == limit:
+                        break
+            return detections
+
+    def __len__(self) -> int:
+        return len(self._entries)
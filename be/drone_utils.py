@@ -2,6 +2,7 @@
 drone_utils:
 Utilities for interacting with the drones.
 """
+import itertools
 import struct
 from enum import IntEnum
 from typing import List, Tuple, Union, NewType, Dict, Any
@@ -12,6 +13,8 @@ from ros2_stub import Command
 RTT_WEIGHTING = 0.125
 RTT_TIMEOUT_MULTIPLIER = 10    # This, multiplied by RTT, determines the timeout
 MC_HEARTBEAT_INTERVAL = 1 # 1 s
+# DroneState attributes whose changes do not count as a new `state_version`, as they change on every cycle
+UNVERSIONED_ATTRIBUTES = ("_tick_lag", "state_version")
 
 # Drone ID type definition
 DroneId = NewType("DroneId", int)
@@ -40,6 +43,15 @@ class DroneCommandId(IntEnum):
 class PathAlgo(IntEnum):
     BAYES           = 0  # Force RTB. No further commands will be accepted.
     SPIRAL          = 1
+    LOOKAHEAD       = 2  # Bayesian search planned over several steps
+    ZIGZAG          = 3
+
+class SimulatedPathState(IntEnum):
+    """ State of the simulated path of a drone, which is computed in the background """
+    NONE    = 0  # No simulated path has been requested
+    PENDING = 1  # Simulated path is being computed
+    READY   = 2  # Simulated path is available
+    FAILED  = 3  # Simulated path could not be computed
 
 class DroneCommand:
     """ Interface for a command """
@@ -82,7 +94,12 @@ class DroneState:
     - The webserver using this SHOULD NOT MODIFY any of the attributes, and should instead
     access data via the getter methods provided.
     - This is because attribute modification is done by the ROS2 node which runs in a separate thread.
+    - `state_version` changes whenever an attribute (other than `UNVERSIONED_ATTRIBUTES`) is set, so that readers
+    can tell that the drone is unchanged without reading it. Versions are unique across all drones, so a version
+    from a write that raced with a later one never matches a version that was read before the later write.
     """
+    _versions = itertools.count(1)
+
     def __init__(self, drone_id: DroneId):
         self._drone_id = drone_id
         self._mode = DroneMode.DISCONNECTED
@@ -90,7 +107,19 @@ class DroneState:
         self._estimated_rtt = 0.0
         self._position: Union[LatLon, None] = None
         self._last_command: Union[DroneCommand, None] = None
+        self._tick_lag = 0.0
         self.simulated_path = dict()
+        self.simulated_path_state = SimulatedPathState.NONE
+        self.simulated_path_version = 0    # Incremented whenever a simulated path or its state is published
+
+    def __setattr__(self, name: str, value: Any):
+        super().__setattr__(name, value)
+        if name not in UNVERSIONED_ATTRIBUTES:
+            super().__setattr__("state_version", next(DroneState._versions))
+
+    def get_state_version(self) -> int:
+        """ Version of the state, which changes whenever it does. Read it before the state it stands for. """
+        return self.state_version
 
     def get_drone_id(self) -> DroneId:
         return self._drone_id
@@ -112,10 +141,38 @@ class DroneState:
         """ Returns the most recent DroneCommand sent to the drone, or None if not set yet. """
         return self._last_command
 
+    def get_tick_lag(self) -> float:
+        """ Seconds between when the last simulation cycle of the drone was due and when it was applied. """
+        return self._tick_lag
+
     def get_simulated_path(self):
         return self.simulated_path
 
-    def toJSON(self) -> Dict:
+    def get_simulated_path_state(self) -> SimulatedPathState:
+        return self.simulated_path_state
+
+    def get_simulated_path_version(self) -> int:
+        return self.simulated_path_version
+
+    def set_simulated_path(self, simulated_path: Dict, state: SimulatedPathState):
+        """ Publishes a simulated path and its state, as a new version. """
+        self.simulated_path = simulated_path
+        self.simulated_path_state = state
+        self.simulated_path_version += 1
+
+    def get_simulated_path_record(self) -> Tuple[int, SimulatedPathState, Dict]:
+        """ Returns the version, state and simulated path, all from the same version. """
+        while True:
+            version = self.simulated_path_version
+            state, simulated_path = self.simulated_path_state, self.simulated_path
+            if version == self.simulated_path_version:
+                return version, state, simulated_path
+
+    def toJSON(self, include_simulated_path: bool = True) -> Dict:
+        """
+        - `include_simulated_path`: Whether to include the simulated path, which can otherwise be fetched by its
+        `simulated_path_version`.
+        """
         lat, lon = None, None
         if self._position is not None:
             lat, lon = self._position.lat, self._position.lon
@@ -131,9 +188,13 @@ class DroneState:
             "position": {
                 "lat": lat, "lon": lon
             },
-            "simulated_path": self.get_simulated_path(),
+            "simulated_path_state": str(self.get_simulated_path_state().name),
+            "simulated_path_version": self.get_simulated_path_version(),
             "last_command": command,
+            "tick_lag": self.get_tick_lag(),
         }
+        if include_simulated_path:
+            ret["simulated_path"] = self.get_simulated_path()
         return ret
     
     def __repr__(self) -> str:
@@ -1,10 +1,34 @@
+"""
+evaluation:
+Monte Carlo comparison of the Bayesian pathfinder, with greedy and lookahead planning, against a zigzag sweep.
+
+Trials are run in parallel over a process pool. Each trial has its own seed derived from `--seed`, so results are
+reproducible regardless of the number of workers. Per-trial metrics are written to the results file as trials
+complete, replacing the results of a previous run unless `--append` is given, and averages with confidence
+intervals are printed at the end.
+
+For the pathfinders, the expected detection per step (the probability mass of the clusters found per search step,
+under their prior maps) and the planning latency per step are also reported.
+
+Usage:
+```bash
+python3 evaluation.py --trials 100 --workers 8 --output evaluation_results.jsonl
+```
+"""
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from time import perf_counter
+
 import numpy as np
 import folium
-from scipy.stats import multivariate_normal
-from typing import List, Tuple
-import h3
+from scipy.stats import multivariate_normal, t as student_t
+from typing import Dict, List, Tuple
+import h3.api.basic_int as h3_int
 
-from pathfinder.pathfinder import BayesianHexSearch, init_empty_prob_map, update_prob_map_w_hotspots, update_probability_map
+from drone_utils import PathAlgo
+from pathfinder.pathfinder import create_pathfinder, init_empty_prob_map, update_prob_map_w_hotspots, update_probability_map
 from maplib import LatLon
 
 # Constants
@@ -15,6 +39,8 @@ START_TUPLE = (1.34254, 103.96381)
 PROBABILITY_DECAY = 0.95
 N_DRONES = 4  # Number of drones
 N_TRIALS = 100
+N_VICTIMS = 15
+CONFIDENCE = 0.95
 
 boundary_pts = [
     (1.34554, 103.95949),
@@ -37,7 +63,9 @@ hotspots = [
 ]
 
 # Function to generate victims around hotspots using Gaussian distribution
-def generate_victims(n_victims: int, hotspots: List[Tuple[float, float]], boundary_pts: List[Tuple[float, float]]):
+def generate_victims(n_victims: int, hotspots: List[Tuple[float, float]], boundary_pts: List[Tuple[float, float]], rng: np.random.Generator = None):
+    if rng is None:
+        rng = np.random.default_rng()
     hotspots_np = np.array(hotspots)
     boundary_pts_np = np.array(boundary_pts)
     
@@ -52,12 +80,20 @@ def generate_victims(n_victims: int, hotspots: List[Tuple[float, float]], bounda
     
     combined_pdf /= np.sum(combined_pdf)
     
-    victim_indices = np.random.choice(np.arange(combined_pdf.size), p=combined_pdf.ravel(), size=n_victims)
+    victim_indices = rng.choice(np.arange(combined_pdf.size), p=combined_pdf.ravel(), size=n_victims)
     victim_coords = np.column_stack(np.unravel_index(victim_indices, combined_pdf.shape))
     victims = np.column_stack((grid_x[victim_coords[:, 0], victim_coords[:, 1]], grid_y[victim_coords[:, 0], victim_coords[:, 1]]))
 
     return victims
 
+# Function to index victims by the hexagon they are in
+def index_victims(victim_hexagons: List[int]) -> Dict[int, List[int]]:
+    """ Maps each hexagon containing victims to the indices of those victims, so that detection is a single lookup. """
+    victims_by_hex = {}
+    for j, victim_hex in enumerate(victim_hexagons):
+        victims_by_hex.setdefault(victim_hex, []).append(j)
+    return victims_by_hex
+
 # Function to create a zigzag path
 def create_zigzag_path(hexagons, hex_centers):
     rows = {}
@@ -80,7 +116,7 @@ def create_zigzag_path(hexagons, hex_centers):
     return zigzag_path
 
 # Function to run the zigzag search
-def run_zigzag_search(boundary_pts: List[Tuple[float, float]], victim_hexagons: List[str], n_drones: int):
+def run_zigzag_search(boundary_pts: List[Tuple[float, float]], victim_hexagons: List[int], n_drones: int):
     
     polygon = {
         'type': 'Polygon',
@@ -89,16 +125,17 @@ def run_zigzag_search(boundary_pts: List[Tuple[float, float]], victim_hexagons:
         ]]
     }
     
-    hexagons = list(h3.polyfill(polygon, DEFAULT_RESOLUTION, geo_json_conformant=True))
-    hex_centers = {h: h3.h3_to_geo(h) for h in hexagons}
+    hexagons = list(h3_int.polyfill(polygon, DEFAULT_RESOLUTION, geo_json_conformant=True))
+    hex_centers = {h: h3_int.h3_to_geo(h) for h in hexagons}
     sorted_hexagons = sorted(hexagons, key=lambda h: (hex_centers[h][0], hex_centers[h][1]))
     zigzag_path = create_zigzag_path(sorted_hexagons, hex_centers)
     
     detected_history_base = {}
-    
-    for i in range(len(zigzag_path)):
-        for j in range(len(victim_hexagons)):
-            if victim_hexagons[j] == zigzag_path[i] and j not in detected_history_base:
+    victims_by_hex = index_victims(victim_hexagons)
+
+    for i, hex in enumerate(zigzag_path):
+        for j in victims_by_hex.get(hex, ()):
+            if j not in detected_history_base:
                 detected_history_base[j] = i
     detected_divided = [step % (len(zigzag_path) / n_drones) for step in detected_history_base.values()]
     metrics = {
@@ -111,7 +148,8 @@ def run_zigzag_search(boundary_pts: List[Tuple[float, float]], victim_hexagons:
     return metrics
 
 # Function to run the pathfinder search (assumed implementation)
-def run_pathfinder_search(boundary_pts: List[Tuple[float, float]], victim_hexagons: List[str], hotspots: List[Tuple[float, float]], n_drones: int):
+def run_pathfinder_search(boundary_pts: List[Tuple[float, float]], victim_hexagons: List[int], hotspots: List[Tuple[float, float]], n_drones: int,
+        path_algo: PathAlgo = PathAlgo.BAYES):
     # Assumes the presence of pathfinder logic to be implemented
     # Placeholder for the actual pathfinder logic
     CLUSTER_THRESHOLD = 0.1
@@ -128,10 +166,14 @@ def run_pathfinder_search(boundary_pts: List[Tuple[float, float]], victim_hexago
     clusters = list(clusters.values())
     clusters = sorted(clusters, key=lambda x:len(x[1]), reverse=False)
 
+    victims_by_hex = index_victims(victim_hexagons)
     available_drones = [i for i in range(n_drones)]
-    step_count = [0 for _ in range(4)]
-    drone_current_pos = [START_TUPLE for _ in range(4)]
+    step_count = [0 for _ in range(n_drones)]
+    drone_current_pos = [START_TUPLE for _ in range(n_drones)]
     detected_history = {}
+    expected_detections = 0.0   # Sum over the clusters of the probability mass found under their prior maps
+    search_steps = 0
+    planning_time = 0.0
 
     while len(clusters) > 0:
 
@@ -141,8 +183,8 @@ def run_pathfinder_search(boundary_pts: List[Tuple[float, float]], victim_hexago
 
         # Explore using drone
         # Go to cluster center
-        path_to_cluster_centre = h3.h3_line(h3.geo_to_h3(drone_current_pos[drone][0], drone_current_pos[drone][1], DEFAULT_RESOLUTION),
-                                            h3.geo_to_h3(c[0][0], c[0][1], DEFAULT_RESOLUTION))
+        path_to_cluster_centre = h3_int.h3_line(h3_int.geo_to_h3(drone_current_pos[drone][0], drone_current_pos[drone][1], DEFAULT_RESOLUTION),
+                                                h3_int.geo_to_h3(c[0][0], c[0][1], DEFAULT_RESOLUTION))
         step_count[drone] += len(path_to_cluster_centre) - 1 # not inclusive of current cell
         drone_current_pos[drone] = (c[0][0], c[0][1])
 
@@ -154,68 +196,138 @@ def run_pathfinder_search(boundary_pts: List[Tuple[float, float]], victim_hexago
         # hotspots = cluster[1]
 
         # # Initialize pathfinder
-        pathfinder = BayesianHexSearch(DEFAULT_RESOLUTION, center=target_pos)
+        pathfinder = create_pathfinder(path_algo, DEFAULT_RESOLUTION, target_pos, PROBABILITY_DECAY)
+        undetected = 1.0    # Prior probability that the cluster has not been found yet
 
         path = []
         for i in range(MAX_NUMBER_STEPS):
+            start = perf_counter()
             drone_current_pos[drone] = pathfinder.find_next_step(drone_current_pos[drone], prob_map)
+            planning_time += perf_counter() - start
+            current_hex = h3_int.geo_to_h3(drone_current_pos[drone][0], drone_current_pos[drone][1], DEFAULT_RESOLUTION)
+            slot = prob_map.geometry.slot_of_cell(current_hex)
+            if slot >= 0:
+                detection = undetected * float(prob_map.weights_of(slot)) * PROBABILITY_DECAY
+                expected_detections += detection
+                undetected -= detection
+
             prob_map = update_probability_map(prob_map, drone_current_pos[drone], PROBABILITY_DECAY)
             if i%100==0: path.append(drone_current_pos[drone])
             step_count[drone] += 1
+            search_steps += 1
 
-            for j in range(len(victim_hexagons)):
-                if victim_hexagons[j] == h3.geo_to_h3(drone_current_pos[drone][0], drone_current_pos[drone][1], DEFAULT_RESOLUTION) and j not in detected_history:
+            for j in victims_by_hex.get(current_hex, ()):
+                if j not in detected_history:
                     detected_history[j] = step_count[drone]
 
     metrics = {
         'total_steps': sum(step_count),
         'average_steps_per_drone': sum(step_count)/len(step_count),
         'victims_found': len(detected_history),
-        'average_steps_to_find_victims': sum(list(detected_history.values()))/len(detected_history) if len(detected_history) > 0 else 100000000000
+        'average_steps_to_find_victims': sum(list(detected_history.values()))/len(detected_history) if len(detected_history) > 0 else 100000000000,
+        'expected_detection_per_step': expected_detections / search_steps if search_steps > 0 else 0.0,
+        'planning_latency_ms': planning_time / search_steps * 1000 if search_steps > 0 else 0.0,
     }
     return metrics
 
-# Function to run experiments and collect metrics
-def run_experiments(boundary_pts: List[Tuple[float, float]], hotspots: List[Tuple[float, float]], n_trials: int, n_victims: int, n_drones: int):
-    zigzag_metrics = []
-    pathfinder_metrics = []
-    
-    for i in range(n_trials):
-        print(f'Starting trial {i}...')
-        victims = generate_victims(n_victims, hotspots, boundary_pts)
-        victim_hexagons = [h3.geo_to_h3(victim[0], victim[1], DEFAULT_RESOLUTION) for victim in victims]
-        print(f'| Zigzag')
-        zigzag_metrics.append(run_zigzag_search(boundary_pts, victim_hexagons, n_drones))
-        print(f'| Probability')
-        pathfinder_metrics.append(run_pathfinder_search(boundary_pts, victim_hexagons, hotspots, n_drones))
-        print("\n\n")
-    
-    return zigzag_metrics, pathfinder_metrics
-
-# Function to calculate average metrics
-def calculate_average_metrics(metrics_list: List[dict]):
-    avg_metrics = {
-        'total_steps': np.mean([m['total_steps'] for m in metrics_list]),
-        'average_steps_per_drone': np.mean([m['average_steps_per_drone'] for m in metrics_list]),
-        'victims_found': np.mean([m['victims_found'] for m in metrics_list]),
-        'average_steps_to_find_victims': np.mean([m['average_steps_to_find_victims'] for m in metrics_list])
+# Function to run a single trial
+def run_trial(trial: int, seed: int, boundary_pts: List[Tuple[float, float]], hotspots: List[Tuple[float, float]], n_victims: int, n_drones: int) -> Dict:
+    rng = np.random.default_rng(seed)
+    victims = generate_victims(n_victims, hotspots, boundary_pts, rng)
+    victim_hexagons = [h3_int.geo_to_h3(victim[0], victim[1], DEFAULT_RESOLUTION) for victim in victims]
+
+    start = perf_counter()
+    zigzag = run_zigzag_search(boundary_pts, victim_hexagons, n_drones)
+    pathfinder = run_pathfinder_search(boundary_pts, victim_hexagons, hotspots, n_drones, PathAlgo.BAYES)
+    lookahead = run_pathfinder_search(boundary_pts, victim_hexagons, hotspots, n_drones, PathAlgo.LOOKAHEAD)
+    return {
+        'trial': trial,
+        'seed': seed,
+        'duration': perf_counter() - start,
+        'zigzag': zigzag,
+        'pathfinder': pathfinder,
+        'lookahead': lookahead,
     }
-    return avg_metrics
-
-# Run experiments
-n_victims = 15
-zigzag_metrics, pathfinder_metrics = run_experiments(boundary_pts, hotspots, N_TRIALS, n_victims, N_DRONES)
-
-print("Zigzag:", zigzag_metrics)
-print("Pathfinder:", pathfinder_metrics)
-print("\n\n")
-
-# Calculate average metrics
-avg_zigzag_metrics = calculate_average_metrics(zigzag_metrics)
-avg_pathfinder_metrics = calculate_average_metrics(pathfinder_metrics)
-
-print("Zigzag Search Average Metrics:", avg_zigzag_metrics)
-print("Pathfinder Search Average Metrics:", avg_pathfinder_metrics)
-
-
 
+# Function to run experiments and collect metrics
+def run_experiments(boundary_pts: List[Tuple[float, float]], hotspots: List[Tuple[float, float]], n_trials: int, n_victims: int, n_drones: int,
+        seed: int = 0, n_workers: int = None, output: str = None, append: bool = False):
+    """
+    Runs `n_trials` trials over a pool of `n_workers` processes, returning the zigzag, greedy pathfinder and lookahead
+    pathfinder metrics of each trial, in trial order.
+    - Trial `i` uses the `i`th seed generated from `seed`, so the results do not depend on `n_workers`.
+    - If `output` is given, the result of each trial is written to it as a line of JSON as soon as the trial completes.
+    The file is overwritten, unless `append` is set.
+    """
+    trial_seeds = np.random.SeedSequence(seed).generate_state(n_trials).tolist()
+    results = {}
+
+    out_file = open(output, "a" if append else "w") if output is not None else None
+    try:
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            futures = [
+                executor.submit(run_trial, trial, trial_seeds[trial], boundary_pts, hotspots, n_victims, n_drones)
+                for trial in range(n_trials)
+            ]
+            for future in as_completed(futures):
+                result = future.result()
+                results[result['trial']] = result
+                print(f"Trial {result['trial']} completed in {result['duration']:.1f}s ({len(results)}/{n_trials})")
+                if out_file is not None:
+                    out_file.write(json.dumps(result) + "\n")
+                    out_file.flush()
+    finally:
+        if out_file is not None:
+            out_file.close()
+
+    zigzag_metrics = [results[trial]['zigzag'] for trial in range(n_trials)]
+    pathfinder_metrics = [results[trial]['pathfinder'] for trial in range(n_trials)]
+    lookahead_metrics = [results[trial]['lookahead'] for trial in range(n_trials)]
+    return zigzag_metrics, pathfinder_metrics, lookahead_metrics
+
+# Function to calculate the confidence interval of each metric
+def calculate_confidence_intervals(metrics_list: List[dict], confidence: float = CONFIDENCE) -> Dict[str, Tuple[float, float, float]]:
+    """ Returns the mean of each metric, and the bounds of its confidence interval (Student's t), as (mean, low, high). """
+    intervals = {}
+    for key in metrics_list[0].keys():
+        values = np.array([m[key] for m in metrics_list], dtype=np.float64)
+        mean = values.mean()
+        if len(values) > 1:
+            half_width = student_t.ppf((1 + confidence) / 2, len(values) - 1) * values.std(ddof=1) / np.sqrt(len(values))
+        else:
+            half_width = float('nan')
+        intervals[key] = (mean, mean - half_width, mean + half_width)
+    return intervals
+
+def format_metric(value: float) -> str:
+    """ Formats a metric with two decimals, or with four significant digits below 1, e.g. a probability per step. """
+    return f"{value:.2f}" if abs(value) >= 1 or value == 0 else f"{value:.4g}"
+
+def print_confidence_intervals(name: str, intervals: Dict[str, Tuple[float, float, float]], confidence: float = CONFIDENCE):
+    print(f"{name} Search Metrics (mean, {confidence:.0%} CI):")
+    for key, (mean, low, high) in intervals.items():
+        print(f"  {key}: {format_metric(mean)} [{format_metric(low)}, {format_metric(high)}]")
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Compare the Bayesian pathfinders against a zigzag sweep over Monte Carlo trials.")
+    parser.add_argument("--trials", type=int, default=N_TRIALS, help="Number of trials")
+    parser.add_argument("--victims", type=int, default=N_VICTIMS, help="Number of victims per trial")
+    parser.add_argument("--drones", type=int, default=N_DRONES, help="Number of drones")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Number of worker processes")
+    parser.add_argument("--seed", type=int, default=0, help="Seed from which the seed of each trial is derived")
+    parser.add_argument("--output", type=str, default="evaluation_results.jsonl", help="File to write per-trial results to")
+    parser.add_argument("--append", action="store_true", help="Append to the results file instead of overwriting it")
+    args = parser.parse_args(args)
+
+    zigzag_metrics, pathfinder_metrics, lookahead_metrics = run_experiments(
+        boundary_pts, hotspots, args.trials, args.victims, args.drones,
+        seed=args.seed, n_workers=args.workers, output=args.output, append=args.append,
+    )
+    print("\n")
+
+    print_confidence_intervals("Zigzag", calculate_confidence_intervals(zigzag_metrics))
+    print_confidence_intervals("Pathfinder", calculate_confidence_intervals(pathfinder_metrics))
+    print_confidence_intervals("Lookahead Pathfinder", calculate_confidence_intervals(lookahead_metrics))
+
+if __name__ == "__main__":
+    main()
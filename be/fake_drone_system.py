@@ -2,23 +2,42 @@
 fake_drone_system:
 A fake system of drones to simulate interaction between the ROS2 mission control node and drone nodes
 """
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
+from enum import Enum
+from heapq import heappop, heappush
+import itertools
 import struct
 import random
 import logging
+import math
 from threading import Lock, Event, RLock, Thread
-from typing import Dict, Tuple, Any
-from queue import Queue
-from time import sleep
+from typing import Callable, Dict, List, Tuple, Any
+from queue import Queue, SimpleQueue
+from time import perf_counter, sleep
+
+import numpy as np
 
 from constants import HOME_POSITION
 
-from drone_utils import DroneId, DroneState, DroneMode, DroneCommand, DroneCommandId, PathAlgo
-from maplib import LatLon
-from pathfinder.pathfinder import N_RINGS_CLUSTER, PathfinderState, init_empty_prob_map, update_prob_map_w_hotspots
+from drone_utils import DroneId, DroneState, DroneMode, DroneCommand, DroneCommandId, PathAlgo, SimulatedPathState
+from maplib import GeodesyMode, LatLon, geodetic_to_ned, ned_to_geodetic
+from pathfinder.pathfinder import N_RINGS_CLUSTER, PathfinderState
+from pathfinder.shared_map import ProbabilityMapService
 
 DRONE_CYCLE_INTERVAL = 1
 DRONE_SPEED = 3  # In metres/s, UNTESTED.
+KINEMATICS_GEODESY = GeodesyMode.LOCAL  # Drones move within a few km of home, where the local approximation holds
+ARRIVAL_THRESHOLD = 1  # In metres, distance within which a drone has reached its target
+LANE_WORKERS = 2  # Number of threads handling the commands and arrivals of drones in real time
+EVENT_BATCH_SIZE = 1000  # Events processed between checks for exit, when the event simulation is not paced
+MOVING_MODES = (DroneMode.TRAVEL, DroneMode.SEARCH, DroneMode.RTB)  # Modes in which a drone moves towards its target
+
+class SimulationMode(Enum):
+    """ How `DroneSystem` advances time """
+    REAL_TIME = 0   # Every drone moves once per `DRONE_CYCLE_INTERVAL` of wall-clock time
+    EVENT = 1       # Discrete-event simulation on a virtual clock (see `EventSimulation`)
 
 def unpack_command(cmd: DroneCommand) -> Dict[str, Any]:
     """ Unpacks a Command from the Mission Control. """
@@ -40,7 +59,7 @@ def unpack_command(cmd: DroneCommand) -> Dict[str, Any]:
             offset += struct.calcsize("!ff")
         ret["sector_start_pos"] = LatLon(sector_start_lat, sector_start_lon)
         ret["hotspots"] = hotspots
-        ret["path_algo"] = PathAlgo.BAYES if algo==0 else PathAlgo.SPIRAL
+        ret["path_algo"] = PathAlgo(algo) if algo in iter(PathAlgo) else PathAlgo.SPIRAL
     elif cmd_id == DroneCommandId.MOVE_TO:
         coords = struct.unpack("!ff", cmd_data)
         ret["goto_pos"] = LatLon(coords[0], coords[1])
@@ -58,8 +77,14 @@ class _SingletonMeta(type):
     
 class Drone:
     """ Fake drone """
-    def __init__(self, drone_id: DroneId, drone_states: Dict[DroneId, DroneState], start_pos: LatLon):
+    def __init__(self, drone_id: DroneId, drone_states: Dict[DroneId, DroneState], start_pos: LatLon,
+            map_service: ProbabilityMapService = None):
+        """
+        - `map_service`: Provides the probability maps of clusters, shared with the other drones of the mission.
+        Defaults to a service used by this drone only.
+        """
         self.drone_id = drone_id
+        self.map_service = map_service if map_service is not None else ProbabilityMapService()
         self.logger = logging.getLogger(f"drone_{drone_id}")
         self.drone_states = drone_states
         self.drone_states[drone_id]._position = start_pos
@@ -89,50 +114,66 @@ class Drone:
             case DroneMode.DISCONNECTED:
                 pass
 
+    def is_moving(self) -> bool:
+        """ Whether the drone is in a mode in which it moves towards its target """
+        return self.drone_states[self.drone_id].get_mode() in MOVING_MODES
+
     def updatePositionWithCycle(self):
         """ Update the position of the drone in a single cycle """
-        threshold = 1
         with self._lock:
             pos = self.drone_states[self.drone_id].get_position()
-            dist = self.target_pos.distFromPoint(pos)
             if pos is None:
                 return
+            north, east = geodetic_to_ned(self.target_pos.lat, self.target_pos.lon, pos, KINEMATICS_GEODESY)
+            dist = math.hypot(north, east)
             
-            if dist <= threshold:
-                match self.drone_states[self.drone_id].get_mode():
-                    case DroneMode.TRAVEL:
-                        if self.next_mode is None:
-                            raise NotImplementedError()
-                        self.set_drone_mode(self.next_mode)
-                    case DroneMode.SEARCH:
-                        if self.pathfinder is None:
-                            raise NotImplementedError(f"Drone {self.drone_id} in SEARCH mode, but no pathfinder object found")
-                        next_pos = self.pathfinder.get_next_waypoint(self.target_pos)
-                        if next_pos:
-                            self.target_pos = next_pos
-                        else:
-                            # Return None means finish search for now (hardcoded in PathFinderState.get_next_waypoint)
-                            self.set_drone_mode(DroneMode.TRAVEL, DroneMode.IDLE)
-                            self.set_drone_target_pos(HOME_POSITION.lat, HOME_POSITION.lon)
-                    case DroneMode.RTB:
-                        self.set_drone_mode(self.next_mode)
+            if dist <= ARRIVAL_THRESHOLD:
+                self._arrive()
                 return
             
-            # Otherwise, we move by a certain speed
-            if dist >= self.speed:
-                # Here, we won't reach the target within the next cycle.
-                distance_vec = self.target_pos.toXY(pos)
-                distance_vec.x = (distance_vec.x / dist) * self.speed
-                distance_vec.y = (distance_vec.y / dist) * self.speed
-
-                self.drone_states[self.drone_id]._position = distance_vec.toLatLon()
-            else:
-                # Here, we WILL reach the target within the next cycle, but speed will overshoot.
-                distance_vec = self.target_pos.toXY(pos)
-                distance_vec.x = (distance_vec.x / dist) * dist
-                distance_vec.y = (distance_vec.y / dist) * dist
-
-                self.drone_states[self.drone_id]._position = distance_vec.toLatLon()
+            # Otherwise, we move by a certain speed. If we will reach the target within the next cycle, we stop on it.
+            step = min(self.speed * DRONE_CYCLE_INTERVAL, dist)
+            lat, lon = ned_to_geodetic(north / dist * step, east / dist * step, pos, KINEMATICS_GEODESY)
+            self.drone_states[self.drone_id]._position = LatLon(float(lat), float(lon))
+
+    def time_to_target(self) -> float:
+        """
+        Seconds until the drone reaches its target at its speed, or None if it is not moving.
+        Returns 0 if it is already within `ARRIVAL_THRESHOLD` of the target.
+        """
+        with self._lock:
+            pos = self.drone_states[self.drone_id].get_position()
+            if pos is None or not self.is_moving():
+                return None
+            north, east = geodetic_to_ned(self.target_pos.lat, self.target_pos.lon, pos, KINEMATICS_GEODESY)
+            dist = math.hypot(north, east)
+            return 0.0 if dist <= ARRIVAL_THRESHOLD else dist / self.speed
+
+    def arrive_at_target(self):
+        """ Places the drone on its target, and carries out what it does on arrival """
+        with self._lock:
+            self.drone_states[self.drone_id]._position = self.target_pos
+            self._arrive()
+
+    def _arrive(self):
+        """ Switches mode or takes the next waypoint, once the drone has reached its target. The lock must be held. """
+        match self.drone_states[self.drone_id].get_mode():
+            case DroneMode.TRAVEL:
+                if self.next_mode is None:
+                    raise NotImplementedError()
+                self.set_drone_mode(self.next_mode)
+            case DroneMode.SEARCH:
+                if self.pathfinder is None:
+                    raise NotImplementedError(f"Drone {self.drone_id} in SEARCH mode, but no pathfinder object found")
+                next_pos = self.pathfinder.get_next_waypoint(self.target_pos)
+                if next_pos:
+                    self.target_pos = next_pos
+                else:
+                    # Return None means finish search for now (hardcoded in PathFinderState.get_next_waypoint)
+                    self.set_drone_mode(DroneMode.TRAVEL, DroneMode.IDLE)
+                    self.set_drone_target_pos(HOME_POSITION.lat, HOME_POSITION.lon)
+            case DroneMode.RTB:
+                self.set_drone_mode(self.next_mode)
 
     def handle_command(self, drone_command: DroneCommand):
         print(f"Drone {self.drone_id}: Received command {DroneCommandId(drone_command.command_id).name}")
@@ -150,10 +191,12 @@ class Drone:
                 target_pos = command["sector_start_pos"]
                 self.set_drone_target_pos(target_pos.lat, target_pos.lon)
                 with self._lock:
-                    prob_map = init_empty_prob_map(target_pos, N_RINGS_CLUSTER)
-                    prob_map = update_prob_map_w_hotspots(probability_map=prob_map, hotspots=command["hotspots"])
-                    self.pathfinder = PathfinderState(target_pos, prob_map, command["path_algo"])
-                    self.drone_states[self.drone_id].simulated_path = self.pathfinder.simulated_path
+                    shared_map = self.map_service.cluster_map(target_pos, N_RINGS_CLUSTER, command["hotspots"])
+                    self.pathfinder = PathfinderState(target_pos, path_algo=command["path_algo"], shared_map=shared_map)
+                    self.drone_states[self.drone_id].set_simulated_path(dict(), SimulatedPathState.PENDING)
+                    # The simulated path is published once it has been computed in the background
+                    pathfinder = self.pathfinder
+                    pathfinder.simulated_path_future.add_done_callback(lambda future: self.set_drone_simulated_path(pathfinder, future))
         
         self.set_drone_last_command(drone_command)
             
@@ -189,26 +232,330 @@ class Drone:
         with self._lock:
             self.target_pos = LatLon(new_lat, new_lon)
 
+    def set_drone_simulated_path(self, pathfinder: PathfinderState, future: Future):
+        """ Publishes the simulated path computed by `pathfinder`, unless the drone has since been given another one. """
+        with self._lock:
+            if pathfinder is not self.pathfinder:
+                return
+            if future.cancelled() or future.exception() is not None:
+                self.logger.error(f"Failed to compute simulated path: {None if future.cancelled() else future.exception()}")
+                self.drone_states[self.drone_id].set_simulated_path(dict(), SimulatedPathState.FAILED)
+                return
+            self.drone_states[self.drone_id].set_simulated_path(future.result(), SimulatedPathState.READY)
+
     def set_drone_last_command(self, command: DroneCommand):
         with self._lock:
             self.drone_states[self.drone_id]._last_command = command
     
+class FleetKinematics:
+    """
+    Moves a fleet of drones in real time, with one vectorised step per cycle for the whole fleet.
+
+    The positions, targets and speeds of the drones are held in NumPy arrays, indexed by the order of `drone_ids` (see `index`).
+    Each cycle, every moving drone moves by up to its speed towards its target, as in `Drone.updatePositionWithCycle()`,
+    except that the offsets to the targets and the new positions are computed for all drones at once. Only the drones
+    that have reached their target are handled one at a time, by `Drone._arrive()`.
+
+    The arrays are the positions that the fleet moves from, so `sync()` must be called for a drone whenever its
+    position, target, speed or mode is changed outside of `step()`, e.g. by a command.
+    """
+    def __init__(self, drones: Dict[DroneId, Drone]):
+        self.drones = drones
+        self.drone_ids: List[DroneId] = list(drones)
+        self.index: Dict[DroneId, int] = {drone_id: i for i, drone_id in enumerate(self.drone_ids)}
+        n_drones = len(self.drone_ids)
+        self.lats = np.zeros(n_drones, dtype=np.float64)
+        self.lons = np.zeros(n_drones, dtype=np.float64)
+        self.target_lats = np.zeros(n_drones, dtype=np.float64)
+        self.target_lons = np.zeros(n_drones, dtype=np.float64)
+        self.speeds = np.zeros(n_drones, dtype=np.float64)
+        self.moving = np.zeros(n_drones, dtype=bool)
+
+        for drone_id, drone in drones.items():
+            if not drone.is_moving():
+                drone.cycle()   # Completes initialisation
+            self.sync(drone_id)
+
+    def sync(self, drone_id: DroneId):
+        """ Reloads the position, target, speed and mode of a drone. """
+        i = self.index[drone_id]
+        drone = self.drones[drone_id]
+        with drone._lock:
+            pos = drone.drone_states[drone_id].get_position()
+            self.moving[i] = pos is not None and drone.is_moving()
+            if pos is not None:
+                self.lats[i], self.lons[i] = pos.lat, pos.lon
+            self.target_lats[i], self.target_lons[i] = drone.target_pos.lat, drone.target_pos.lon
+            self.speeds[i] = drone.speed
+
+    def arrive(self, drone_id: DroneId):
+        """ Carries out the arrival of a drone at its target, and reloads it. """
+        drone = self.drones[drone_id]
+        with drone._lock:
+            drone._arrive()
+        self.sync(drone_id)
+
+    def step(self, frozen: np.ndarray = None, on_arrival: Callable[[DroneId], None] = None) -> int:
+        """
+        Moves every moving drone by one cycle. Drones within `ARRIVAL_THRESHOLD` of their target do not move, and
+        carry out their arrival instead. Returns the number of drones that arrived.
+        - `frozen`: Mask of the drones that are not stepped in this cycle, by index.
+        - `on_arrival`: Called with the ID of each drone that arrived, instead of `arrive()`.
+        """
+        moving = np.flatnonzero(self.moving if frozen is None else self.moving & ~frozen)
+        if len(moving) == 0:
+            return 0
+        lats, lons = self.lats[moving], self.lons[moving]
+        north, east = geodetic_to_ned(self.target_lats[moving], self.target_lons[moving], LatLon(lats, lons), KINEMATICS_GEODESY)
+        dist = np.hypot(north, east)
+        arrived = dist <= ARRIVAL_THRESHOLD
+
+        # Move the other drones by their speed. If they will reach their target within this cycle, they stop on it.
+        flying = ~arrived
+        movers = moving[flying]
+        scale = np.minimum(self.speeds[movers] * DRONE_CYCLE_INTERVAL, dist[flying]) / dist[flying]
+        new_lats, new_lons = ned_to_geodetic(
+            north[flying] * scale, east[flying] * scale, LatLon(lats[flying], lons[flying]), KINEMATICS_GEODESY
+        )
+        self.lats[movers], self.lons[movers] = new_lats, new_lons
+        for i, lat, lon in zip(movers.tolist(), new_lats.tolist(), new_lons.tolist()):
+            drone_id = self.drone_ids[i]
+            self.drones[drone_id].drone_states[drone_id]._position = LatLon(lat, lon)
+
+        arrivals = moving[arrived].tolist()
+        on_arrival = on_arrival if on_arrival is not None else self.arrive
+        for i in arrivals:
+            on_arrival(self.drone_ids[i])
+        return len(arrivals)
+
+class DroneLanes:
+    """
+    Runs tasks for each drone on a bounded pool of worker threads.
+    The tasks of a drone run one at a time, in the order they were submitted, and a drone is busy from when a task
+    is submitted until its last task has finished. Tasks of different drones run concurrently.
+    """
+    def __init__(self, max_workers: int = LANE_WORKERS):
+        self._pool = ThreadPoolExecutor(max_workers, thread_name_prefix="drone_lane")
+        self._lanes: Dict[DroneId, deque] = {}  # Tasks of each busy drone that have not started
+        self._lock = Lock()
+        self.logger = logging.getLogger("drone_lanes")
+
+    def submit(self, drone_id: DroneId, fn: Callable, *args):
+        """ Runs `fn(*args)` after the tasks already submitted for the drone. """
+        with self._lock:
+            lane = self._lanes.get(drone_id)
+            if lane is not None:
+                lane.append((fn, args))
+                return
+            self._lanes[drone_id] = deque([(fn, args)])
+        self._pool.submit(self._run_next, drone_id)
+
+    def _run_next(self, drone_id: DroneId):
+        """ Runs the next task of a drone, then yields the worker to other drones. """
+        with self._lock:
+            fn, args = self._lanes[drone_id].popleft()
+        try:
+            fn(*args)
+        except Exception:
+            self.logger.exception(f"Task for drone {drone_id} failed")
+        with self._lock:
+            if not self._lanes[drone_id]:
+                del self._lanes[drone_id]
+                return
+        self._pool.submit(self._run_next, drone_id)
+
+    def busy(self) -> List[DroneId]:
+        """ Returns the IDs of the drones that have tasks running or pending. """
+        with self._lock:
+            return list(self._lanes)
+
+class FleetScheduler:
+    """
+    Runs the real-time simulation of a fleet, with one cycle every `interval` seconds.
+
+    The fleet is moved on the scheduler thread with `FleetKinematics`, while the work done for a single drone
+    (handling its commands and its arrivals) runs on `DroneLanes`. A drone that is busy with such work is not stepped
+    until it is done, so that work for each drone is applied in order, but a slow command for one drone does not
+    delay the cycles of the others.
+
+    The tick lag of each drone, i.e. the time between when a cycle was due and when it was applied to the drone,
+    is published in its `DroneState`.
+    """
+    def __init__(self, drones: Dict[DroneId, Drone], commands: Queue, max_workers: int = LANE_WORKERS,
+            interval: float = DRONE_CYCLE_INTERVAL):
+        self.drones = drones
+        self.commands = commands
+        self.interval = interval
+        self.fleet = FleetKinematics(drones)
+        self.lanes = DroneLanes(max_workers)
+        self.tick_lags = np.zeros(len(drones), dtype=np.float64)
+        self._applied = np.full(len(drones), perf_counter(), dtype=np.float64)  # When the last applied cycle was due
+        self._updated: SimpleQueue[DroneId] = SimpleQueue()    # Drones changed by the lanes, to reload in the fleet
+
+    def _handle_command(self, drone_id: DroneId, drone_command: DroneCommand):
+        self.drones[drone_id].handle_command(drone_command)
+        self._updated.put(drone_id)
+
+    def _arrive(self, drone_id: DroneId):
+        drone = self.drones[drone_id]
+        with drone._lock:
+            drone._arrive()
+        self._updated.put(drone_id)
+
+    def tick(self, due: float):
+        """ Runs the cycle that was due at `due`, in `perf_counter()` time. """
+        # Drones that finished their work after this are left for the next cycle, so they are already reloaded then
+        frozen = np.zeros(len(self.fleet.drone_ids), dtype=bool)
+        frozen[[self.fleet.index[drone_id] for drone_id in self.lanes.busy()]] = True
+        while not self._updated.empty():
+            self.fleet.sync(self._updated.get())
+
+        self.fleet.step(frozen, on_arrival=lambda drone_id: self.lanes.submit(drone_id, self._arrive, drone_id))
+
+        # Check for commands
+        while not self.commands.empty():
+            drone_id, drone_command = self.commands.get()
+            self.lanes.submit(drone_id, self._handle_command, drone_id, drone_command)
+
+        # Frozen drones are still waiting for the cycle after the last one applied to them
+        now = perf_counter()
+        self._applied[~frozen] = due
+        self.tick_lags = np.where(frozen, now - (self._applied + self.interval), now - due)
+        for drone_id, tick_lag in zip(self.fleet.drone_ids, self.tick_lags.tolist()):
+            self.drones[drone_id].drone_states[drone_id]._tick_lag = tick_lag
+
+    def run(self, exit: Event):
+        """ Runs a cycle every `interval` seconds, until `exit` is set. """
+        due = perf_counter()
+        while not exit.is_set():
+            self.tick(due)
+            due += self.interval
+            exit.wait(max(0.0, due - perf_counter()))
+
+class EventSimulation:
+    """
+    Discrete-event simulation of a set of drones on a virtual clock, in seconds.
+
+    Instead of moving every drone once per cycle, the time at which each moving drone reaches its target is computed
+    from its distance and speed, and pushed onto a priority queue of arrival events. Processing an event places the
+    drone on its target, carries out its arrival (see `Drone.arrive_at_target()`), and schedules its next arrival.
+    Between events, drones are only moved when their position is needed (see `advance()`).
+
+    Events are invalidated rather than removed when a command changes the target of a drone, by versioning the
+    events of each drone.
+    """
+    def __init__(self, drones: Dict[DroneId, Drone], commands: Queue):
+        """
+        - `commands`: Queue of (drone ID, command) to the drones, handled at the current virtual time by `run()`.
+        """
+        self.drones = drones
+        self.commands = commands
+        self.now = 0.0
+        self.n_events = 0   # Number of arrivals processed
+        self._events: List[Tuple[float, int, DroneId, int]] = []   # (time, sequence number, drone ID, version)
+        self._seq = itertools.count()   # Orders events at the same time by when they were scheduled
+        self._versions: Dict[DroneId, int] = {drone_id: 0 for drone_id in drones}
+        self._legs: Dict[DroneId, Tuple[float, float, LatLon]] = {}   # (departure, arrival, start) of moving drones
+
+        for drone_id, drone in drones.items():
+            if not drone.is_moving():
+                drone.cycle()   # Completes initialisation
+            self.schedule(drone_id)
+
+    def schedule(self, drone_id: DroneId):
+        """ Replaces the arrival event of a drone with one computed from its current position and target. """
+        self._versions[drone_id] += 1
+        self._legs.pop(drone_id, None)
+        drone = self.drones[drone_id]
+        duration = drone.time_to_target()
+        if duration is None:
+            return
+        arrival = self.now + duration
+        self._legs[drone_id] = (self.now, arrival, drone.drone_states[drone_id].get_position())
+        heappush(self._events, (arrival, next(self._seq), drone_id, self._versions[drone_id]))
+
+    def advance(self, drone_id: DroneId):
+        """ Moves a drone to where it is at the current virtual time, along the straight line to its target. """
+        leg = self._legs.get(drone_id)
+        if leg is None:
+            return
+        departure, arrival, start = leg
+        if arrival <= departure or self.now <= departure:
+            return
+        drone = self.drones[drone_id]
+        fraction = min((self.now - departure) / (arrival - departure), 1.0)
+        north, east = geodetic_to_ned(drone.target_pos.lat, drone.target_pos.lon, start, KINEMATICS_GEODESY)
+        lat, lon = ned_to_geodetic(north * fraction, east * fraction, start, KINEMATICS_GEODESY)
+        drone.set_drone_position(float(lat), float(lon))
+
+    def advance_all(self):
+        """ Moves every drone to where it is at the current virtual time, e.g. before their states are displayed. """
+        for drone_id in self._legs:
+            self.advance(drone_id)
+
+    def handle_commands(self):
+        """ Handles the queued commands at the current virtual time. """
+        while not self.commands.empty():
+            drone_id, drone_command = self.commands.get()
+            self.advance(drone_id)
+            self.drones[drone_id].handle_command(drone_command)
+            self.schedule(drone_id)
+
+    def run(self, until: float = math.inf, max_events: int = None) -> int:
+        """
+        Handles the queued commands, then processes the events up to virtual time `until`, after which the clock is
+        set to `until`. Without `until`, runs until no drone is moving.
+        - `max_events`: Stops after this many events, leaving the clock at the last one.
+        Returns the number of events processed.
+        """
+        self.handle_commands()
+        n_events = 0
+        while self._events and self._events[0][0] <= until:
+            if max_events is not None and n_events >= max_events:
+                break
+            time, _, drone_id, version = heappop(self._events)
+            if version != self._versions[drone_id]:
+                continue    # Superseded by a command
+            self.now = time
+            self.drones[drone_id].arrive_at_target()
+            self.schedule(drone_id)
+            n_events += 1
+        self.n_events += n_events
+        if math.isfinite(until) and (not self._events or self._events[0][0] > until):
+            self.now = max(self.now, until)
+        return n_events
+
+    def is_idle(self) -> bool:
+        """ Whether no drone is moving and no command is queued. """
+        return not self._legs and self.commands.empty()
+
 class DroneSystem(metaclass=_SingletonMeta):
     """
     This runs in a separate thread to simulate both the mission_control_node and the drones.
+    - In `SimulationMode.REAL_TIME`, every drone moves once per `DRONE_CYCLE_INTERVAL` of wall-clock time, as
+    scheduled by a `FleetScheduler`.
+    - In `SimulationMode.EVENT`, drones are simulated by an `EventSimulation`, whose virtual clock runs at
+    `speed_multiplier` times wall-clock time, or as fast as possible if it is `math.inf`.
     """
-    def __init__(self, drone_states: Dict[DroneId, DroneState], start_pos: LatLon):
+    def __init__(self, drone_states: Dict[DroneId, DroneState], start_pos: LatLon,
+            mode: SimulationMode = SimulationMode.REAL_TIME, speed_multiplier: float = 1.0):
         self.drones: Dict[DroneId, Drone] = {}
         self.commands: Queue[Tuple[DroneId, DroneCommand]] = Queue()  # Simulated command queue from mission control node to drones
+        self.map_service = ProbabilityMapService()  # Probability maps shared by the drones searching each cluster
         for drone_id in drone_states.keys():
-            self.drones[drone_id] = Drone(drone_id, drone_states, start_pos)
+            self.drones[drone_id] = Drone(drone_id, drone_states, start_pos, self.map_service)
 
+        self.mode = mode
+        self.speed_multiplier = speed_multiplier
+        self.simulation = EventSimulation(self.drones, self.commands) if mode == SimulationMode.EVENT else None
+        self.scheduler = FleetScheduler(self.drones, self.commands) if mode == SimulationMode.REAL_TIME else None
         self.modification_lock = Lock()
         self.exit = Event()
     
     def start(self):
         """ A thread that simulates drone movements """
-        self._t = Thread(target=self._start, daemon=True)
+        target = self._start if self.mode == SimulationMode.REAL_TIME else self._run_events
+        self._t = Thread(target=target, daemon=True)
         self._t.start()
 
     def connect_drones(self):
@@ -216,16 +563,19 @@ class DroneSystem(metaclass=_SingletonMeta):
             drone.connect()
 
     def _start(self):
-        while not self.exit.is_set():
-            # Step each drone
-            for drone in self.drones.values():
-                drone.cycle()
-
-            # Check for commands
-            while not self.commands.empty():
-                drone_id, drone_command = self.commands.get()
-                self.drones[drone_id].handle_command(drone_command)
+        self.scheduler.run(self.exit)
 
+    def _run_events(self):
+        """ Runs the event simulation until `exit` is set, paced by `speed_multiplier`. """
+        simulation = self.simulation
+        wall_start, virtual_start = perf_counter(), simulation.now
+        while not self.exit.is_set():
+            if math.isinf(self.speed_multiplier):
+                if simulation.run(max_events=EVENT_BATCH_SIZE) == 0:
+                    sleep(DRONE_CYCLE_INTERVAL)     # Wait for commands
+                continue
+            simulation.run(until=virtual_start + (perf_counter() - wall_start) * self.speed_multiplier)
+            simulation.advance_all()
             sleep(DRONE_CYCLE_INTERVAL)
 
     def add_command(self, drone_id: DroneId, drone_command: DroneCommand):
@@ -1,3 +1,4 @@
+import argparse
 from datetime import datetime
 import random
 import threading
@@ -7,7 +8,7 @@ from typing import Dict, Tuple
 
 from drone_utils import DroneId, DroneState, DroneCommand, DroneCommandId
 from detection_utils import DetectedEntity
-from mission_control_webserver import MCWebServer
+from mission_control_webserver import SERVER_THREADS, MCWebServer, ServerMode
 from fake_drone_system import DroneSystem
 from mission_utils import Mission
 from constants import HOME_POSITION
@@ -65,6 +66,12 @@ class MCNode:
             self.detected_queue.put(DetectedEntity(drone_id=drone_id, coordinates=self.drone_states[drone_id].get_position(), time_found=datetime.now()))
 
 def main(args=None):
+    parser = argparse.ArgumentParser(description="Run mission control with a simulated drone system.")
+    parser.add_argument("--server", choices=[mode.name.lower() for mode in ServerMode], default=ServerMode.DEBUG.name.lower(),
+        help="WSGI server of the web server: Flask's debug server, werkzeug's threaded server, or waitress")
+    parser.add_argument("--threads", type=int, default=SERVER_THREADS, help="Worker threads of the waitress server")
+    args = parser.parse_args(args)
+
     mission = Mission()
     drone_states = {
         DroneId(1): DroneState(1),
@@ -77,7 +84,8 @@ def main(args=None):
 
     # Start web server
     webserver = MCWebServer(mission, drone_states, commands, detected_queue)
-    webserver_thread = threading.Thread(target=webserver.run, daemon=True)
+    webserver_thread = threading.Thread(target=webserver.run, daemon=True,
+        kwargs={"mode": ServerMode[args.server.upper()], "threads": args.threads})
     webserver_thread.start()
 
     # Start rclpy node
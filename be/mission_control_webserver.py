@@ -4,12 +4,15 @@ A Flask webserver that:
 - Provides a REST API to interact with drones.
     - When a route is called, the route function generates the necessary command with the `DroneCommand` API,
     and places it in the command queue in `self.commands`. This command queue is accessed every second (by default).
-    - Drone information is obtained by accessing the getters or `toJSON()` methods of the drone states
+    - Drone information is obtained by accessing the getters or `toJSON()` methods of the drone states, through a
+    versioned `StateStore`, so that clients can poll for the changes since their last poll.
 - Provides a web client to interact with the API.
     - The web client is provided in the `static` directory provided in the package.
 """
 import logging
 import json
+from datetime import datetime
+from enum import Enum
 from flask import Flask, jsonify, request, send_from_directory, Response
 from typing import Dict, Tuple
 from queue import Queue
@@ -21,14 +24,41 @@ from mission_utils import Mission, SetEncoder
 from drone_utils import DroneState, DroneId, PathAlgo
 from drone_utils import DroneCommand, DroneCommand_SEARCH_SECTOR, DroneCommand_MOVE_TO
 from run_clustering import run_clustering
+from state_store import StateStore, encode_info
+from telemetry_stream import STREAM_INTERVAL, TelemetryStream
 from maplib import LatLon
 from flask_cors import CORS
+from werkzeug.serving import make_server
 
 logging.getLogger("flask_cors").level = logging.ERROR
 logging.getLogger("werkzeug").level = logging.ERROR
 
+MAX_DETECTIONS_PAGE = 500  # Largest page of `/api/detections`
+SERVER_HOST = "127.0.0.1"
+SERVER_PORT = 5000
+SERVER_THREADS = 32  # Worker threads of `ServerMode.WAITRESS`. Each client of `/api/stream` holds one.
+STREAM_THREAD_SHARE = 0.5  # Share of the worker threads of `ServerMode.WAITRESS` that clients of `/api/stream` may hold
+
+class ServerMode(Enum):
+    """ WSGI server that `MCWebServer.run` serves the app with """
+    DEBUG = 0       # Flask's development server, with the debugger
+    THREADED = 1    # Werkzeug's server without the debugger, with a thread per request
+    WAITRESS = 2    # Waitress, with a fixed pool of `threads` worker threads (optional dependency)
+
+# Search algorithms selectable with the `path_algo` argument of `start_operation`. Others default to the spiral.
+PATH_ALGOS = {
+    "bayes": PathAlgo.BAYES,
+    "lookahead": PathAlgo.LOOKAHEAD,
+    "spiral": PathAlgo.SPIRAL,
+    "zigzag": PathAlgo.ZIGZAG,
+}
+
 class MCWebServer:
-    def __init__(self, mission:Mission, drone_states: Dict[int, DroneState], commands: Queue[Tuple[DroneId, DroneCommand]], detected_queue: Queue[DetectedEntity]):
+    def __init__(self, mission:Mission, drone_states: Dict[int, DroneState], commands: Queue[Tuple[DroneId, DroneCommand]], detected_queue: Queue[DetectedEntity],
+            stream_interval: float = STREAM_INTERVAL):
+        """
+        - `stream_interval`: Seconds between the messages of `/api/stream`.
+        """
         self.static_dir = Path("frontend")
         # Flask.logger_name = "listlogger"
         app = Flask(
@@ -45,10 +75,16 @@ class MCWebServer:
         self.commands: Queue[Tuple[DroneId, DroneCommand]] = commands
         self.assigner = SimpleQueueAssigner()
         self.detected_queue = detected_queue
+        self.mission.detected.start(detected_queue)
+        self.state_store = StateStore(mission, drone_states)
+        self.telemetry_stream = TelemetryStream(self.state_store, stream_interval)
 
         # Set up Endpoints
         self.app.add_url_rule("/", view_func=self.route_index)
         self.app.add_url_rule("/api/info", view_func=self.route_info)
+        self.app.add_url_rule("/api/stream", view_func=self.route_stream)
+        self.app.add_url_rule("/api/detections", view_func=self.route_detections)
+        self.app.add_url_rule("/api/drones/<int:drone_id>/simulated_path", view_func=self.route_simulated_path)
         self.app.add_url_rule("/hotspot/add", methods=["POST"], view_func=self.route_add_hotspot)
         self.app.add_url_rule("/hotspot/delete", methods=["POST"], view_func=self.route_delete_hotspot)
         self.app.add_url_rule("/api/action/moveto", view_func=self.route_action_moveto)
@@ -62,23 +98,79 @@ class MCWebServer:
     def route_index(self):
         return send_from_directory(self.static_dir, "index.html")
 
-    def route_info(self) -> Dict:
-        drones = {}
-        for drone_id, drone_state in self.drone_states.items():
-            drones[drone_id] = drone_state.toJSON()  # Ensure this method returns a serializable dictionary
-
-        while not self.detected_queue.empty():
-            self.mission.detected.append(self.detected_queue.get())
-
-        ret = {
-            "drones": drones,
-            "hotspots": self.mission.hotspots,  # Assuming this is already serializable
-            "clusters": self.mission.cluster_centres,  # Assuming this is already serializable
-            "clusters_to_explore" : self.mission.cluster_centres_to_explore,
-            "detected" : [entity.to_dict() for entity in self.mission.detected]
-        }
-        
-        return jsonify(ret)
+    def route_info(self) -> Response:
+        """
+        Returns the state of the drones and the mission, with its sequence number `seq` and the `epoch` of the store.
+        - `since`, `epoch`: Sequence number and epoch of a previous response. Only the drones, detections and mission
+        fields that have changed since are returned, and `detected` only holds the detections added or merged into
+        since. The full state is returned if the epoch is not that of the store, e.g. after the server has restarted.
+        Simulated paths are not included, and are fetched with `route_simulated_path` by their version.
+        """
+        since = request.args.get("since", type=int, default=None)
+        epoch = request.args.get("epoch", type=str, default=None)
+        return Response(encode_info(self.state_store.info(since, epoch)), mimetype="application/json")
+
+    def route_stream(self) -> Response:
+        """
+        Streams the changes to the state as server-sent events, in the format of `route_info`.
+        - `since`, `epoch`: Sequence number and epoch to resume from. Default to the `Last-Event-ID` of a reconnecting
+        client, `<epoch>-<seq>`, and otherwise the stream starts with the full state.
+        Returns 503 if the stream has as many clients as it may hold, and the client should poll `route_info` instead.
+        """
+        if self.telemetry_stream.is_full():
+            return {"error": "too many clients of /api/stream, poll /api/info instead"}, 503
+        since = request.args.get("since", type=int, default=None)
+        epoch = request.args.get("epoch", type=str, default=None)
+        last_event_id = request.headers.get("Last-Event-ID", "")
+        if since is None and "-" in last_event_id:
+            epoch, _, last_seq = last_event_id.rpartition("-")
+            since = int(last_seq) if last_seq.isdigit() else None
+        response = Response(self.telemetry_stream.subscribe(since, epoch), mimetype="text/event-stream")
+        response.headers["Cache-Control"] = "no-cache"
+        response.headers["X-Accel-Buffering"] = "no"
+        return response
+
+    def route_detections(self) -> Tuple[Dict, int]:
+        """
+        Returns a page of the detections in memory, in order of ID.
+        - `start`, `end`: Time range in which the detections were found, as ISO 8601 datetimes.
+        - `after_id`: Only returns detections after this ID, e.g. the `next_after_id` of the previous page.
+        - `limit`: Maximum number of detections returned, up to `MAX_DETECTIONS_PAGE`.
+        """
+        try:
+            start, end = (datetime.fromisoformat(request.args[arg]) if arg in request.args else None for arg in ("start", "end"))
+        except ValueError:
+            return {"error": "start and end must be ISO 8601 datetimes"}, 400
+        after_id = request.args.get("after_id", type=int, default=0)
+        limit = min(request.args.get("limit", type=int, default=MAX_DETECTIONS_PAGE), MAX_DETECTIONS_PAGE)
+        if limit < 1:
+            return {"error": "limit must be at least 1"}, 400
+        detections = self.mission.detected.query(start, end, after_id, limit)
+        return {
+            "detections": detections,
+            "next_after_id": detections[-1]["id"] if detections and len(detections) == limit else None,
+        }, 200
+
+    def route_simulated_path(self, drone_id: int):
+        """
+        Returns the simulated path of a drone, with its version and state.
+        - `version`: The version the client expects. Responses for a matching version can be cached indefinitely.
+        """
+        drone_state = self.drone_states.get(drone_id)
+        if drone_state is None:
+            return {"error": f"no drone with ID {drone_id}"}, 404
+        version, state, simulated_path = drone_state.get_simulated_path_record()
+        response = jsonify({
+            "drone_id": str(drone_id),
+            "version": version,
+            "simulated_path_state": state.name,
+            "simulated_path": simulated_path,
+        })
+        if request.args.get("version", type=int, default=None) == version:
+            response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+        else:
+            response.headers["Cache-Control"] = "no-cache"
+        return response
     
     def route_action_moveto(self) -> Tuple[Dict, int]:
         drone_id = request.args.get("drone_id", type=int, default=None)
@@ -141,41 +233,67 @@ class MCWebServer:
     def route_add_hotspot(self):
         data = request.form.to_dict()
         hotspot = json.loads(data.get('hotspot_position', None))
-        if (hotspot["latlng"]["lat"],hotspot["latlng"]["lng"]) not in self.mission.hotspots:
-            self.mission.hotspots.append((hotspot["latlng"]["lat"],hotspot["latlng"]["lng"])) # Should be a set here
-        else:
-            print("Already added")
+        with self.mission.lock:
+            if (hotspot["latlng"]["lat"],hotspot["latlng"]["lng"]) not in self.mission.hotspots:
+                self.mission.hotspots.append((hotspot["latlng"]["lat"],hotspot["latlng"]["lng"])) # Should be a set here
+            else:
+                print("Already added")
         return {}, 200
     
     def route_delete_hotspot(self):
         data = request.form.to_dict()
         hotspot = json.loads(data.get('hotspot_position', None))
-        self.mission.hotspots.remove((hotspot["latlng"][0],hotspot["latlng"][1])) # Should be a set here
+        with self.mission.lock:
+            self.mission.hotspots.remove((hotspot["latlng"][0],hotspot["latlng"][1])) # Should be a set here
         return {}, 200
 
     def route_run_clustering(self):
-        cluster_centres = run_clustering(self.mission.hotspots) # cluster_centres: Dict[int, Tuple[Tuple[float,float], List[Tuple[float,float]]]]
+        with self.mission.lock:
+            hotspots = list(self.mission.hotspots)
+        # Clustering runs outside the lock, so that it does not hold up other requests
+        cluster_centres = run_clustering(hotspots) # cluster_centres: Dict[int, Tuple[Tuple[float,float], List[Tuple[float,float]]]]
         # Each cluster center value is represented by a tuple: (centre latlon, list of latlon hotspots)
-        self.mission.cluster_centres = cluster_centres
-        self.mission.cluster_centres_to_explore = [cluster for cluster in cluster_centres.values()]
+        with self.mission.lock:
+            self.mission.cluster_centres = cluster_centres
+            self.mission.cluster_centres_to_explore = [cluster for cluster in cluster_centres.values()]
         return cluster_centres
     
     def route_start_operation(self):
         """Run assignment on drones in drone state, cluster centers and command drones to search sector"""
         algo = request.args.get("path_algo", type=str, default="bayes")
-        assignments = self.assigner.fit(self.mission.cluster_centres_to_explore, self.drone_states)
+        path_algo = PATH_ALGOS.get(algo, PathAlgo.SPIRAL)
+        with self.mission.lock:
+            assignments = self.assigner.fit(self.mission.cluster_centres_to_explore, self.drone_states)
         for drone_id, cluster in assignments.items():
-            if algo == "bayes": command_tup = (drone_id, DroneCommand_SEARCH_SECTOR(LatLon(cluster[0][0], cluster[0][1]), cluster[1], PathAlgo.BAYES))
-            else: command_tup = (drone_id, DroneCommand_SEARCH_SECTOR(LatLon(cluster[0][0], cluster[0][1]), cluster[1], PathAlgo.SPIRAL))
+            command_tup = (drone_id, DroneCommand_SEARCH_SECTOR(LatLon(cluster[0][0], cluster[0][1]), cluster[1], path_algo))
             self.commands.put_nowait(command_tup)
         return {}, 200        
 
     def add_headers(self, response: Response):
-        response.headers.add("Content-Type", "application/json")
-        response.headers.add("Access-Control-Allow-Methods", "PUT, GET ,POST, DELETE, OPTIONS")
-        response.headers.add("Access-Control-Allow-Origin", "*")
-        response.status = 200
+        # The Content-Type and status are set by each route. Headers are set rather than added, as flask_cors may
+        # already have set them.
+        response.headers["Access-Control-Allow-Methods"] = "PUT, GET ,POST, DELETE, OPTIONS"
+        response.headers["Access-Control-Allow-Origin"] = "*"
         return response
     
-    def run(self):
-        self.app.run(debug=True, use_reloader=False)
\ No newline at end of file
+    def run(self, mode: ServerMode = ServerMode.DEBUG, host: str = SERVER_HOST, port: int = SERVER_PORT,
+            threads: int = SERVER_THREADS):
+        """
+        Serves the app until the process exits.
+        - `threads`: Number of worker threads of `ServerMode.WAITRESS`. Clients of `/api/stream` may hold at most
+        `STREAM_THREAD_SHARE` of them, and further clients are turned away to poll `/api/info`.
+        """
+        match mode:
+            case ServerMode.DEBUG:
+                self.app.run(host, port, debug=True, use_reloader=False)
+            case ServerMode.THREADED:
+                make_server(host, port, self.app, threaded=True).serve_forever()
+            case ServerMode.WAITRESS:
+                try:
+                    import waitress
+                except ImportError as e:
+                    raise ImportError("ServerMode.WAITRESS requires waitress (pip install waitress)") from e
+                self.telemetry_stream.max_clients = int(threads * STREAM_THREAD_SHARE)
+                # Keeps channels readable while they are served, so that a client of `/api/stream` that disconnects
+                # frees its thread at the next message rather than after several failed writes
+                waitress.serve(self.app, host=host, port=port, threads=threads, channel_request_lookahead=1)
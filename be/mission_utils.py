@@ -1,9 +1,10 @@
 from enum import IntEnum
 from datetime import datetime
 import json
+from threading import Lock
 from typing import Dict, List, Tuple
 
-from detection_utils import DetectedEntity
+from detection_utils import DetectionLog
 
 class MissionStage(IntEnum):
     """ Current mode reported of mission """
@@ -22,7 +23,9 @@ class Mission:
         self.hotspots = []
         self.cluster_centres: Dict[int, Tuple[Tuple[float,float], List[Tuple[float,float]]]] = {}
         self.cluster_centres_to_explore: Tuple[Tuple[float,float], List[Tuple[float,float]]] = [] # Queue of clusters to explore
-        self.detected:List[DetectedEntity] = []
+        self.detected = DetectionLog()  # Detections, fed from the detected queue once started
+        # Held while the hotspots and clusters are read or modified, as requests are served on several threads
+        self.lock = Lock()
 
 class SetEncoder(json.JSONEncoder):
     def default(self, obj):
@@ -0,0 +1,101 @@
+"""
+coverage:
+Precomputed coverage plans for the pathfinders that sweep a cluster in a fixed order.
+
+A plan is the ordered list of waypoints (hexagons) that covers every hexagon of a cluster, generated once from the
+local IJ grid of the cluster geometry (see `pathfinder.geometry`), without calling H3. Plans only depend on the
+centre hexagon and the number of rings, so they are cached with bounded LRU caches and shared between drones.
+
+Plans can be shipped as a single packed buffer with `CoveragePlan.to_bytes()`.
+"""
+import struct
+from dataclasses import dataclass
+from functools import lru_cache
+
+import h3.api.basic_int as h3_int
+import numpy as np
+
+from pathfinder.geometry import GEOMETRY_CACHE_SIZE, cluster_geometry
+
+# Local IJ steps taken along each edge of a ring of the outward spiral, starting from the end of the previous ring
+SPIRAL_DIRECTIONS = np.array([(0, -1), (1, 0), (1, 1), (0, 1), (-1, 0), (-1, -1), (0, -1)], dtype=np.int64)
+
+@dataclass(frozen=True, eq=False)
+class CoveragePlan:
+    """
+    Ordered waypoints covering a cluster. This is shared between pathfinders, so it MUST NOT be modified.
+    - `centre_cell`: Integer H3 index of the centre hexagon of the cluster.
+    - `cells`: Integer H3 index of each waypoint, in order.
+    - `latlon`: Centre (lat, lon) of each waypoint, of shape (n, 2).
+    """
+    centre_cell: int
+    cells: np.ndarray
+    latlon: np.ndarray
+
+    @staticmethod
+    def from_cells(cells: np.ndarray, latlon: np.ndarray, centre_cell: int) -> 'CoveragePlan':
+        cells = np.array(cells, dtype=np.uint64)
+        latlon = np.array(latlon, dtype=np.float64).reshape(-1, 2)
+        for array in (cells, latlon):
+            array.flags.writeable = False
+        return CoveragePlan(centre_cell=int(centre_cell), cells=cells, latlon=latlon)
+
+    def to_bytes(self) -> bytes:
+        """ Packs the plan as its centre cell and number of waypoints (`!QI`), followed by the cell of each waypoint (`!Q`). """
+        return struct.pack("!QI", self.centre_cell, len(self.cells)) + self.cells.astype(">u8").tobytes()
+
+    @staticmethod
+    def from_bytes(data: bytes) -> 'CoveragePlan':
+        """ Unpacks a plan packed by `to_bytes()`. """
+        centre_cell, n_waypoints = struct.unpack_from("!QI", data, 0)
+        cells = np.frombuffer(data, dtype=">u8", count=n_waypoints, offset=struct.calcsize("!QI")).astype(np.uint64)
+        latlon = [h3_int.h3_to_geo(cell) for cell in cells.tolist()]
+        return CoveragePlan.from_cells(cells, latlon, centre_cell)
+
+    def __deepcopy__(self, memo) -> 'CoveragePlan':
+        return self     # Immutable, so copies of a pathfinder can share it
+
+    def __len__(self) -> int:
+        return len(self.cells)
+
+def spiral_offsets(n_rings: int) -> np.ndarray:
+    """
+    Local IJ offsets from the centre of the waypoints of an outward spiral over `n_rings` rings, of shape (n, 2).
+    Each ring starts with a step out of the previous one, and is traversed edge by edge.
+    """
+    steps = [np.zeros((1, 2), dtype=np.int64)]
+    for k in range(1, n_rings + 1):
+        steps.append(np.repeat(SPIRAL_DIRECTIONS, [1, k-1, k, k, k, k, k], axis=0))
+    return np.cumsum(np.concatenate(steps), axis=0)
+
+def zigzag_offsets(n_rings: int) -> np.ndarray:
+    """
+    Local IJ offsets from the centre of the waypoints of a boustrophedon sweep over `n_rings` rings, of shape (n, 2).
+    The rows of constant I are swept in alternating directions. Consecutive waypoints, including those at the ends
+    of rows, are neighbours.
+    """
+    rows = []
+    for row, i in enumerate(range(-n_rings, n_rings + 1)):
+        j = np.arange(max(-n_rings, i - n_rings), min(n_rings, i + n_rings) + 1, dtype=np.int64)
+        if row % 2:
+            j = j[::-1]
+        rows.append(np.column_stack((np.full(len(j), i, dtype=np.int64), j)))
+    return np.concatenate(rows)
+
+def _plan_from_offsets(centre_cell: int, n_rings: int, offsets: np.ndarray) -> CoveragePlan:
+    """ Looks up the waypoints at local IJ offsets from `centre_cell` in the geometry of its cluster. """
+    geometry = cluster_geometry(centre_cell, n_rings)
+    centre_ij = geometry.local_ij[geometry.slot_of_cell(centre_cell)]
+    slots = geometry.slots_at_ij(centre_ij + offsets)
+    slots = slots[slots >= 0]   # Hexagons that are missing from the grid, e.g. around pentagons
+    return CoveragePlan.from_cells(geometry.cells[slots], geometry.latlon[slots], centre_cell)
+
+@lru_cache(maxsize=GEOMETRY_CACHE_SIZE)
+def spiral_plan(centre_cell: int, n_rings: int) -> CoveragePlan:
+    """ Returns the outward spiral over the `n_rings` rings around `centre_cell`, an integer H3 index. """
+    return _plan_from_offsets(centre_cell, n_rings, spiral_offsets(n_rings))
+
+@lru_cache(maxsize=GEOMETRY_CACHE_SIZE)
+def zigzag_plan(centre_cell: int, n_rings: int) -> CoveragePlan:
+    """ Returns the boustrophedon sweep over the `n_rings` rings around `centre_cell`, an integer H3 index. """
+    return _plan_from_offsets(centre_cell, n_rings, zigzag_offsets(n_rings))
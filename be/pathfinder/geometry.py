@@ -0,0 +1,166 @@
+"""
+geometry:
+Cached geometry of the H3 hexagons in a cluster.
+
+The hexagons in a cluster, along with their centres and local IJ coordinates, only depend on the centre hexagon
+and the number of rings. They are cached here with bounded LRU caches, so that drones tasked with the same cluster
+and repeated evaluation trials reuse them instead of deriving them from H3 again.
+
+Hexagons are held as integer H3 indices (uint64) in NumPy arrays. The string form of the indices is only computed
+when it is needed at the API/JSON boundary.
+
+The cluster is also laid out on a dense 2D grid over the bounding box of its local IJ coordinates, which holds the
+slot of each hexagon. Neighbours and lines of hexagons can then be found with integer arithmetic on IJ coordinates
+and a grid lookup, without calling H3.
+"""
+from dataclasses import dataclass
+from functools import cached_property, lru_cache
+from typing import Dict, Iterable, Tuple, Union
+
+import h3
+import h3.api.basic_int as h3_int
+import numpy as np
+
+from maplib import LatLon
+
+GEOMETRY_CACHE_SIZE = 64        # Number of cluster geometries cached
+CENTROID_CACHE_SIZE = 1 << 16   # Number of hexagon centres cached
+
+# Local IJ offsets of a hexagon and its 6 neighbours, i.e. the cells of `h3.k_ring(h, 1)`
+NEIGHBOUR_OFFSETS = np.array([(0, 0), (1, 0), (1, 1), (0, 1), (-1, 0), (-1, -1), (0, -1)], dtype=np.int64)
+
+def to_cell(h3_index: Union[str, int]) -> int:
+    """ Converts a H3 index, as a string or an integer, to an integer. """
+    return h3.string_to_h3(h3_index) if isinstance(h3_index, str) else int(h3_index)
+
+@dataclass(frozen=True, eq=False)
+class ClusterGeometry:
+    """
+    The hexagons in a cluster. This is shared between probability maps, so it MUST NOT be modified.
+    - `centre_cell`: Integer H3 index of the reference hexagon for local IJ coordinates.
+    - `cells`: Integer H3 index of each hexagon, in slot order.
+    - `latlon`: Centre (lat, lon) of each hexagon, of shape (n, 2).
+    - `local_ij`: Local IJ coordinates of each hexagon relative to `centre_cell`, of shape (n, 2).
+    - `ij_origin`, `slot_grid`: Slot of the hexagon at local IJ coordinates (i, j), stored at
+    `slot_grid[i - ij_origin[0], j - ij_origin[1]]`, or -1 if the cell is not in the cluster.
+    - `neighbour_slots`: Slots of each hexagon and its neighbours, at the offsets of `NEIGHBOUR_OFFSETS`, of shape
+    (n, 7). Neighbours that are not in the cluster are -1.
+    - `hexes`, `index` and `centre_hex` are the string forms of the above, computed on first use.
+    """
+    centre_cell: int
+    cells: np.ndarray
+    latlon: np.ndarray
+    local_ij: np.ndarray
+    ij_origin: np.ndarray
+    slot_grid: np.ndarray
+    neighbour_slots: np.ndarray
+    _sorted_cells: np.ndarray   # `cells` in ascending order, for lookups with `np.searchsorted`
+    _sorted_slots: np.ndarray   # Slot of each cell in `_sorted_cells`
+
+    @staticmethod
+    def from_cells(cells: Iterable[int], centre_cell: int = None) -> 'ClusterGeometry':
+        """ Computes the geometry of a set of hexagons, given as integer H3 indices, in the given order. """
+        cells = np.fromiter((int(cell) for cell in cells), dtype=np.uint64)
+        centre_cell = int(centre_cell) if centre_cell is not None else int(cells[0])
+        cell_list = cells.tolist()
+        latlon = np.array([h3_int.h3_to_geo(cell) for cell in cell_list], dtype=np.float64).reshape(-1, 2)
+        local_ij = np.array(
+            [h3_int.experimental_h3_to_local_ij(centre_cell, cell) for cell in cell_list], dtype=np.int64
+        ).reshape(-1, 2)
+        ij_origin = local_ij.min(axis=0) if len(cells) else np.zeros(2, dtype=np.int64)
+        slot_grid = np.full(tuple(local_ij.max(axis=0) - ij_origin + 1) if len(cells) else (0, 0), -1, dtype=np.int32)
+        slot_grid[local_ij[:, 0] - ij_origin[0], local_ij[:, 1] - ij_origin[1]] = np.arange(len(cells))
+        neighbour_slots = _grid_lookup(slot_grid, ij_origin, local_ij[:, None, :] + NEIGHBOUR_OFFSETS).astype(np.int32)
+        sorted_slots = np.argsort(cells, kind="stable")
+        sorted_cells = cells[sorted_slots]
+        for array in (cells, latlon, local_ij, ij_origin, slot_grid, neighbour_slots, sorted_cells, sorted_slots):
+            array.flags.writeable = False
+
+        return ClusterGeometry(
+            centre_cell=centre_cell,
+            cells=cells,
+            latlon=latlon,
+            local_ij=local_ij,
+            ij_origin=ij_origin,
+            slot_grid=slot_grid,
+            neighbour_slots=neighbour_slots,
+            _sorted_cells=sorted_cells,
+            _sorted_slots=sorted_slots,
+        )
+
+    @staticmethod
+    def from_hexes(hexes: Iterable[Union[str, int]], centre_hex: Union[str, int] = None) -> 'ClusterGeometry':
+        """ Computes the geometry of a set of hexagons, in the given order. """
+        return ClusterGeometry.from_cells(
+            (to_cell(h3_index) for h3_index in hexes), to_cell(centre_hex) if centre_hex is not None else None
+        )
+
+    def slots_of(self, cells: np.ndarray) -> np.ndarray:
+        """ Returns the slot of each of the given integer H3 indices, or -1 for those not in the cluster. """
+        cells = np.asarray(cells, dtype=np.uint64)
+        pos = np.minimum(np.searchsorted(self._sorted_cells, cells), len(self._sorted_cells) - 1)
+        found = self._sorted_cells[pos] == cells
+        return np.where(found, self._sorted_slots[pos], -1)
+
+    def slot_of_cell(self, cell: int) -> int:
+        """ Returns the slot of an integer H3 index, or -1 if it is not in the cluster. """
+        pos = int(self._sorted_cells.searchsorted(np.uint64(cell)))
+        if pos < len(self._sorted_cells) and int(self._sorted_cells[pos]) == cell:
+            return int(self._sorted_slots[pos])
+        return -1
+
+    def slots_at_ij(self, ij: np.ndarray) -> np.ndarray:
+        """ Returns the slot of each of the given local IJ coordinates, of shape (..., 2), or -1 for those not in the cluster. """
+        return _grid_lookup(self.slot_grid, self.ij_origin, ij)
+
+    def slot_at_ij(self, i: int, j: int) -> int:
+        """ Returns the slot of the hexagon at local IJ coordinates (i, j), or -1 if it is not in the cluster. """
+        i, j = i - int(self.ij_origin[0]), j - int(self.ij_origin[1])
+        if 0 <= i < self.slot_grid.shape[0] and 0 <= j < self.slot_grid.shape[1]:
+            return int(self.slot_grid[i, j])
+        return -1
+
+    @cached_property
+    def centre_hex(self) -> str:
+        return h3.h3_to_string(self.centre_cell)
+
+    @cached_property
+    def hexes(self) -> Tuple[str, ...]:
+        """ H3 index of each hexagon as a string, in slot order. """
+        return tuple(h3.h3_to_string(cell) for cell in self.cells.tolist())
+
+    @cached_property
+    def index(self) -> Dict[str, int]:
+        """ Maps the string H3 index of a hexagon to its slot. """
+        return {h3_index: slot for slot, h3_index in enumerate(self.hexes)}
+
+    def __len__(self) -> int:
+        return len(self.cells)
+
+def _grid_lookup(slot_grid: np.ndarray, ij_origin: np.ndarray, ij: np.ndarray) -> np.ndarray:
+    """ Looks up the slots at local IJ coordinates of shape (..., 2) in a slot grid, with -1 for those outside it. """
+    offsets = np.asarray(ij, dtype=np.int64) - ij_origin
+    inside = np.all((offsets >= 0) & (offsets < slot_grid.shape), axis=-1)
+    offsets = np.where(inside[..., None], offsets, 0)
+    return np.where(inside, slot_grid[offsets[..., 0], offsets[..., 1]], -1)
+
+@lru_cache(maxsize=GEOMETRY_CACHE_SIZE)
+def cluster_geometry(centre_cell: int, n_rings: int) -> ClusterGeometry:
+    """
+    Returns the geometry of the `n_rings` rings around `centre_cell`, an integer H3 index.
+    The resolution of the cluster is that of `centre_cell`, so it is part of the cache key.
+    """
+    return ClusterGeometry.from_cells(sorted(h3_int.k_ring(centre_cell, n_rings)), centre_cell)
+
+def cluster_geometry_at(centre_pos: LatLon, n_rings: int, res: int) -> ClusterGeometry:
+    """ Returns the geometry of the `n_rings` rings around the hexagon at `centre_pos`, at resolution `res`. """
+    return cluster_geometry(h3_int.geo_to_h3(centre_pos.lat, centre_pos.lon, res), n_rings)
+
+@lru_cache(maxsize=CENTROID_CACHE_SIZE)
+def cell_centroid(cell: int) -> Tuple[float, float]:
+    """ Returns the centre (lat, lon) of a hexagon, given as an integer H3 index. """
+    return h3_int.h3_to_geo(cell)
+
+def hex_centroid(h3_index: Union[str, int]) -> Tuple[float, float]:
+    """ Returns the centre (lat, lon) of a hexagon. """
+    return cell_centroid(to_cell(h3_index))
@@ -6,77 +6,84 @@ NOTICE for Pathfinding team:
 - I renamed all instances of 'center' to 'centre', and 'centre_hexagon' to 'centre_hex'
 - Currently, `None` is passed to `prob_map`, so an error could occur if the code relies on it.
 """
-from threading import Thread
+from concurrent.futures import Future, ProcessPoolExecutor
+from threading import Lock
+import multiprocessing
 import h3
+import h3.api.basic_int as h3_int
 import numpy as np
 from abc import ABC, abstractmethod
-from typing import Tuple, Dict, NewType
+from typing import Tuple, Dict, List
 from drone_utils import PathAlgo
 from maplib import LatLon
-import copy
 from pathfinder.utils import *
+from pathfinder.coverage import CoveragePlan, spiral_plan, zigzag_plan
+from pathfinder.geometry import ClusterGeometry, cell_centroid, cluster_geometry_at
+from pathfinder.probability_map import ProbabilityMap
 
 DEFAULT_RESOLUTION = 14
 N_RINGS_CLUSTER = 20     # Defines the number of rings in a cluster by default
 PROBABILITY_DECAY=0.3
+LOOKAHEAD_HORIZON = 4       # Number of steps planned ahead by `LookaheadHexSearch`
+LOOKAHEAD_BEAM_WIDTH = 32   # Number of paths kept at each depth of the search of `LookaheadHexSearch`
+LOOKAHEAD_DISTANCE_COST = 0.05  # Cost of each step to the highest probability after the horizon of `LookaheadHexSearch`
+SIMULATION_WORKERS = 2   # Number of processes used to compute simulated paths
 
-# Probability Map type definition: A dictionary, where each H3 hexagon index is mapped to a specific probability.
-ProbabilityMap = NewType("ProbabilityMap", Dict[str, float])
+_SIMULATION_POOL: ProcessPoolExecutor = None
+_SIMULATION_POOL_LOCK = Lock()
 
-def update_prob_map_w_hotspots(probability_map: ProbabilityMap, hotspots: Tuple[float, float],
-        sigma: float = 0.003, r_range: int = 100) -> ProbabilityMap:
+def update_prob_map_w_hotspots(probability_map: ProbabilityMap, hotspots: List[Tuple[float, float]],
+        sigma: float = 0.003, r_range: int = 100, chunk_size: int = 65536) -> ProbabilityMap:
     """
-    Update the probability map based on a given hotspot.
+    Update the probability map based on the given hotspots.
+    Each hexagon within `r_range` rings of a hotspot receives a gaussian probability based on its distance to the hotspot.
+    The gaussians of all hotspots are evaluated against all hexagons in the map at once with NumPy.
 
     Parameters:
-    - prob_en: numpy array representing the probability map
-    - hotspot: tuple containing latitude and longitude of the hotspot
-    - sigma: standard deviation for the gaussian probability distribution
-    - r_range: range for hex_ring (default is 100)
+    - probability_map: the probability map to update
+    - hotspots: list of tuples containing latitude and longitude of each hotspot
+    - sigma: standard deviation for the gaussian probability distribution, in degrees
+    - r_range: number of rings around each hotspot that receive probability (default is 100)
+    - chunk_size: maximum number of hexagons evaluated at once, to bound memory use for large maps
 
     Returns:
-    - Updated prob_en
+    - Updated probability_map
     """
-    def gaussian_probability(dist, sig=0.3):
-        return np.exp(-dist**2 / (2 * sig**2))
-
-    def euclidean(point1, point2):
-        return np.sqrt((point1[0] - point2[0])**2 + (point1[1] - point2[1])**2)
-
-    delta_probability_map = {}
+    hotspot_centres, hotspot_ij = [], []
     for hotspot in hotspots:
-        hex_hotspot = h3.geo_to_h3(hotspot[0], hotspot[1], DEFAULT_RESOLUTION)
+        hex_hotspot = h3_int.geo_to_h3(hotspot[0], hotspot[1], DEFAULT_RESOLUTION)
 
         #NOTE: Sanity check to see if hex_hotspot being added to the map is within the map size
-        if hex_hotspot not in probability_map: print(f'Hex hotspot {hex_hotspot} not in prob_map')
-
-        for i in range(0, r_range):
-            hex_at_r = h3.hex_ring(hex_hotspot, i)
-            if hex_at_r:  # Checking if hex_at_r is not empty
-                distance = euclidean(h3.h3_to_geo(hex_hotspot),
-                                     h3.h3_to_geo(next(iter(hex_at_r))))
-                probability = gaussian_probability(distance, sigma)
-                for hex_idx in hex_at_r:
-                    if hex_idx in probability_map:
-                        delta_probability_map[hex_idx] = probability + delta_probability_map.get(hex_idx, 0)
-                    else:
-                        pass
-    # Normalize the delta_probability_map
-    total_delta_prob = sum(delta_probability_map.values())
+        if hex_hotspot not in probability_map: print(f'Hex hotspot {h3.h3_to_string(hex_hotspot)} not in prob_map')
+
+        try:
+            hotspot_ij.append(h3_int.experimental_h3_to_local_ij(probability_map.centre_cell, hex_hotspot))
+        except ValueError:
+            print(f'Hex hotspot {h3.h3_to_string(hex_hotspot)} is too far from prob_map, ignoring')
+            continue
+        hotspot_centres.append(cell_centroid(hex_hotspot))
+
+    delta_probability = np.zeros(len(probability_map), dtype=np.float64)
+    if len(hotspot_centres) > 0:
+        hotspot_centres = np.array(hotspot_centres, dtype=np.float64)
+        hotspot_ij = np.array(hotspot_ij, dtype=np.int64)
+        for start in range(0, len(probability_map), chunk_size):
+            # Pairwise (hexagon, hotspot) offsets, of shape (chunk, hotspots, 2)
+            offsets = probability_map.latlon[start:start+chunk_size, None, :] - hotspot_centres[None, :, :]
+            ij_offsets = probability_map.local_ij[start:start+chunk_size, None, :] - hotspot_ij[None, :, :]
+
+            dist_sq = np.einsum("chk,chk->ch", offsets, offsets)
+            probability = np.exp(-dist_sq / (2 * sigma**2))
+            probability[hex_grid_distance(ij_offsets[..., 0], ij_offsets[..., 1]) >= r_range] = 0
+            delta_probability[start:start+chunk_size] = probability.sum(axis=1)
+
+    # Normalize the delta probabilities
+    total_delta_prob = delta_probability.sum()
     if total_delta_prob != 0:
-        delta_probability_map = {key: (value / total_delta_prob) for key, value in delta_probability_map.items()}
-    # Update the original probability map with the delta_probability_map
-    for hex_idx, value in delta_probability_map.items():
-        if hex_idx in probability_map:
-            probability_map[hex_idx] += value
-        else:
-            print("Delta not in original prob")
-            pass
-    # Normalize the updated probability map
-    total_prob = sum(probability_map.values())
-    if total_prob != 0:
-        probability_map = {key: (value / total_prob) for key, value in probability_map.items()}
-    else:
+        delta_probability /= total_delta_prob
+    # Update the original probability map with the delta probabilities, and normalise it
+    probability_map.add_probabilities(delta_probability)
+    if not probability_map.normalise():
         print("Entire probability map is zero")
 
     return probability_map
@@ -87,67 +94,109 @@ def init_empty_prob_map(centre_pos: LatLon, n_rings: int) -> ProbabilityMap:
     - `centre_pos`: Centre of the probability map.
     - `n_rings`: Number of rings around the centre hexagon.
     """
-    prob_map = {}
-    h3_indices = h3.k_ring(
-        h3.geo_to_h3(centre_pos.lat, centre_pos.lon, DEFAULT_RESOLUTION),
-        n_rings,
-    )
-
-    for h3_index in h3_indices:
-        prob_map[h3_index] = 0
-    
-    return prob_map
+    return ProbabilityMap(cluster_geometry_at(centre_pos, n_rings, DEFAULT_RESOLUTION))
 
-def update_probability_map( probability_map: dict[str, float], centre: tuple[float, float], f: float) -> dict[str, float]:
+def update_probability_map(probability_map: ProbabilityMap, centre: tuple[float, float], f: float) -> ProbabilityMap:
     """Update the probability map using Bayes theorem.
+    The update and the renormalisation of the map are O(1), see `ProbabilityMap.bayes_update`.
 
     Args:
         :param f: Probability of finding a person
         :param centre:
         :param probability_map:
     """
-    hex_centre = h3.geo_to_h3(
-        centre[0], centre[1], DEFAULT_RESOLUTION)
+    slot = probability_map.geometry.slot_of_cell(h3_int.geo_to_h3(centre[0], centre[1], DEFAULT_RESOLUTION))
     
-    if hex_centre not in probability_map: 
+    if slot < 0:
         print("Has not reached cluster hex map yet") 
         return # When it is traveling to prob map
 
-    # Prior
-    prior = probability_map[hex_centre]
+    # Posterior, with the rest of the map renormalised lazily
+    if not probability_map.bayes_update(slot, f):
+        print("Entire probability map is zero")
+    return probability_map
 
-    # Posterior
-    posterior = prior*(1-f) / (1-prior*f)
-    sum_before_update = sum(probability_map.values())
+def _simulation_pool() -> ProcessPoolExecutor:
+    """
+    Worker pool used to compute simulated paths, created on first use.
+    - Processes are used so that simulations do not compete with the drones for the GIL.
+    - Workers are spawned rather than forked, as mission control is multithreaded. As such, scripts that create a
+    `PathfinderState` must guard their entry point with `if __name__ == "__main__"`.
+    """
+    global _SIMULATION_POOL
+    with _SIMULATION_POOL_LOCK:
+        if _SIMULATION_POOL is None:
+            _SIMULATION_POOL = ProcessPoolExecutor(max_workers=SIMULATION_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _SIMULATION_POOL
+
+def simulate_path(pathfinder: 'PathFinder', prob_map: ProbabilityMap, start_pos: LatLon, max_step: int) -> Dict[int, Dict]:
+    """
+    Simulates a search of `max_step` steps from `start_pos`, returning the path taken.
+    - `prob_map` is modified by the simulation.
+    """
+    cur_pos = start_pos
+    step = 0
+    simulated_path = dict()
 
-    probability_map[hex_centre] = posterior
+    while step < max_step:
+        cur_tup = (cur_pos.lat, cur_pos.lon)
+        next_tup = pathfinder.find_next_step(cur_tup, prob_map)
+        if next_tup is None:
+            break   # The search is complete
 
-    # Distribute
-    sum_after_update = sum(probability_map.values())
-    if sum_after_update != 0:
-        probability_map = {
-            key: value / sum_after_update for key, value in probability_map.items()}
-        return probability_map
-    else:
-        print("Entire probability map is zero")
-        return dict()
+        prob_map = update_probability_map(prob_map, next_tup, PROBABILITY_DECAY)
+        cur_pos = LatLon(next_tup[0], next_tup[1])
+        simulated_path[step] = cur_pos.to_dict()
+        step += 1
+
+    return simulated_path
+
+def create_pathfinder(path_algo: PathAlgo, res: int, centre: Tuple[float, float], f: float = PROBABILITY_DECAY) -> 'PathFinder':
+    """
+    Creates the pathfinder for a search algorithm.
+    - `f`: Probability of finding a person in a hexagon, if they are there. Used by the lookahead planner.
+    """
+    if path_algo == PathAlgo.BAYES:
+        return BayesianHexSearch(res, centre)
+    if path_algo == PathAlgo.LOOKAHEAD:
+        return LookaheadHexSearch(res, centre, f)
+    if path_algo == PathAlgo.ZIGZAG:
+        return ZigzagPathFinder(res, centre)
+    return OutwardSpiralPathFinder(res, centre)
 
 class PathfinderState:
-    """ Pathfinding state utilised by the drone. """
-    def __init__(self, start_pos: LatLon, prob_map: ProbabilityMap = None, path_algo: PathAlgo = PathAlgo.BAYES):
+    """
+    Pathfinding state utilised by the drone.
+    - The simulated path is computed asynchronously on a worker pool. `simulated_path` is None until
+    `simulated_path_future` completes.
+    - Simulations run on copies of the map, which share its prior and only store the cells that they update.
+    Their pathfinders are created for each simulation.
+    """
+    def __init__(self, start_pos: LatLon, prob_map: ProbabilityMap = None, path_algo: PathAlgo = PathAlgo.BAYES,
+            shared_map: 'SharedProbabilityMap' = None):
+        """
+        - `prob_map`: Probability map of the cluster, used by this drone only.
+        - `shared_map`: Probability map of the cluster shared with the other drones searching it (see
+        `pathfinder.shared_map`). If given, `prob_map` is not used.
+        """
         self.max_step = 300
         self.step_count = 0
         self.simulated_path = None
-        start_tup = (start_pos.lat, start_pos.lon)
-        if path_algo == PathAlgo.BAYES:
-            self._pathfinder = BayesianHexSearch(DEFAULT_RESOLUTION, start_tup)  #TODO: to be set by the caller, based on the search method defined by MC
-            self._pathfinder_sim = BayesianHexSearch(DEFAULT_RESOLUTION, start_tup)
-        else:
-            self._pathfinder = OutwardSpiralPathFinder(DEFAULT_RESOLUTION, start_tup)  #TODO: to be set by the caller, based on the search method defined by MC
-            self._pathfinder_sim = OutwardSpiralPathFinder(DEFAULT_RESOLUTION, start_tup)
+        self._path_algo = path_algo
+        self._start_tup = (start_pos.lat, start_pos.lon)
+        self._pathfinder = create_pathfinder(path_algo, DEFAULT_RESOLUTION, self._start_tup)
         self._prob_map = prob_map
-        if self.simulated_path is None:
-            self.simulated_path = self.get_simulated_path(start_pos)
+        self._shared_map = shared_map
+
+        # The simulation works on its own copy of the map, taken before the live search modifies it
+        self.simulated_path_future: Future = _simulation_pool().submit(
+            simulate_path, self._simulation_pathfinder(), self._map_copy(), start_pos, self.max_step
+        )
+        self.simulated_path_future.add_done_callback(self._set_simulated_path)
+
+    def _set_simulated_path(self, future: Future):
+        if not future.cancelled() and future.exception() is None:
+            self.simulated_path = future.result()
 
     def get_next_waypoint(self, cur_pos: LatLon) -> LatLon:
         self.step_count += 1
@@ -155,8 +204,15 @@ class PathfinderState:
             return None
 
         cur_tup = (cur_pos.lat, cur_pos.lon)
-        next_tup = self._pathfinder.find_next_step(cur_tup, self._prob_map)
-        self._prob_map = update_probability_map(self._prob_map, next_tup, PROBABILITY_DECAY)
+        if self._shared_map is not None:
+            next_tup = self._shared_map.step(self._pathfinder, cur_tup, PROBABILITY_DECAY)
+            if next_tup is None:
+                return None
+        else:
+            next_tup = self._pathfinder.find_next_step(cur_tup, self._prob_map)
+            if next_tup is None:
+                return None
+            self._prob_map = update_probability_map(self._prob_map, next_tup, PROBABILITY_DECAY)
 
 
         # TODO: GIF generation
@@ -176,21 +232,17 @@ class PathfinderState:
 
         return LatLon(next_tup[0], next_tup[1])
 
-    def get_simulated_path(self, cur_pos: LatLon) -> Dict[int, Dict]:
-        sim_map = copy.deepcopy(self._prob_map)
-        step = 0
-        simulated_path = dict()
-
-        while step < self.max_step:
-            cur_tup = (cur_pos.lat, cur_pos.lon)
-            next_tup = self._pathfinder_sim.find_next_step(cur_tup, sim_map)
+    def _map_copy(self) -> ProbabilityMap:
+        """ Copy of the current map, for a simulation. """
+        return self._shared_map.snapshot() if self._shared_map is not None else self._prob_map.copy()
 
-            sim_map = update_probability_map(sim_map, next_tup, PROBABILITY_DECAY)
-            cur_pos = LatLon(next_tup[0], next_tup[1])
-            simulated_path[step] = cur_pos.to_dict()
-            step += 1
+    def _simulation_pathfinder(self) -> 'PathFinder':
+        """ Creates a pathfinder for a simulation, in the state in which the search started. """
+        return create_pathfinder(self._path_algo, DEFAULT_RESOLUTION, self._start_tup)
 
-        return simulated_path
+    def get_simulated_path(self, cur_pos: LatLon) -> Dict[int, Dict]:
+        """ Simulates the search from `cur_pos` on a copy of the current map, returning the path taken. """
+        return simulate_path(self._simulation_pathfinder(), self._map_copy(), cur_pos, self.max_step)
 
     def found_signals(self, cur_pos: LatLon, signal_count: int):
         pass
@@ -202,7 +254,8 @@ class PathFinder(ABC):
         - `centre`: Starting position for pathfinder, as tuple of latitude, longitude
         """
         self.res = res
-        self.centre_hex = h3.geo_to_h3(centre[0], centre[1], resolution=self.res)
+        self.centre_cell = h3_int.geo_to_h3(centre[0], centre[1], self.res)
+        self.centre_hex = h3.h3_to_string(self.centre_cell)
 
     @abstractmethod
     def find_next_step(self, current_position: Tuple[float, float], prob_map: np.ndarray) -> Tuple[float, float]:
@@ -217,56 +270,50 @@ class PathFinder(ABC):
         """
         pass
 
-class OutwardSpiralPathFinder(PathFinder):
-    def __init__(self, res: int, centre: tuple):
+class CoveragePathFinder(PathFinder):
+    """Follows a precomputed `CoveragePlan` over the cluster around the starting position, with a cursor.
+    Each step is O(1): the plan is generated once per (centre, rings) and cached, and H3 is only called to check a
+    position that was not returned by the previous step.
+    """
+    def __init__(self, res: int, centre: tuple, plan: CoveragePlan):
         super().__init__(res, centre)
-        self.segment_start_ij_coord = None
-        self.next_path_segment = []
-        self.k_ring = 1
-
-        centre_ij_coord = h3.experimental_h3_to_local_ij(
-            self.centre_hex, self.centre_hex)
-        self.next_path_segment.append(centre_ij_coord)
-        self.segment_start_ij_coord = centre_ij_coord
-
-    # Create path over an entire circle
-    def ring_edge_traversal(self, repetitions, current_ij_coord, i_increment, j_increment):
-        for i in range(repetitions):
-            current_ij_coord = (
-                current_ij_coord[0]+i_increment, current_ij_coord[1]+j_increment)
-            self.next_path_segment.append(current_ij_coord)
-        return current_ij_coord
-
-    # Implementation of abstract method that returns next waypoint
+        self.plan = plan
+        self._cursor = -1   # Index of the last waypoint returned, or -1 before the first step
+
+    def _at_waypoint(self, current_position: Tuple[float, float], index: int) -> bool:
+        """Whether `current_position` is in the hexagon of waypoint `index` of the plan."""
+        if tuple(current_position) == tuple(self.plan.latlon[index].tolist()):
+            return True
+        return h3_int.geo_to_h3(current_position[0], current_position[1], self.res) == int(self.plan.cells[index])
+
     def find_next_step(self, current_position: Tuple[float, float], prob_map: Dict) -> Tuple[float, float]:
-        current_position_ij = h3.experimental_h3_to_local_ij(self.centre_hex, h3.geo_to_h3(
-            current_position[0], current_position[1], resolution=self.res))
-
-        # Waypoints are calculated based on ring
-        if len(self.next_path_segment) == 1 and self.segment_start_ij_coord == current_position_ij:
-            self.segment_start_ij_coord = self.ring_edge_traversal(
-                1, self.segment_start_ij_coord, 0, -1)
-            self.segment_start_ij_coord = self.ring_edge_traversal(
-                self.k_ring-1, self.segment_start_ij_coord, 1, 0)
-            self.segment_start_ij_coord = self.ring_edge_traversal(
-                self.k_ring, self.segment_start_ij_coord, 1, 1)
-            self.segment_start_ij_coord = self.ring_edge_traversal(
-                self.k_ring, self.segment_start_ij_coord, 0, 1)
-            self.segment_start_ij_coord = self.ring_edge_traversal(
-                self.k_ring, self.segment_start_ij_coord, -1, 0)
-            self.segment_start_ij_coord = self.ring_edge_traversal(
-                self.k_ring, self.segment_start_ij_coord, -1, -1)
-            self.segment_start_ij_coord = self.ring_edge_traversal(
-                self.k_ring, self.segment_start_ij_coord, 0, -1)
-            self.k_ring += 1
-
-        if current_position_ij == self.next_path_segment[0]:
-            self.next_path_segment.pop(0)
-            return h3.h3_to_geo(h3.experimental_local_ij_to_h3(self.centre_hex, self.next_path_segment[0][0], self.next_path_segment[0][1]))
-        else:
+        """Returns the next waypoint of the plan, or None once the plan is complete or if the drone is off the plan."""
+        if self._cursor < 0:
+            # Start from the first waypoint, unless the drone is already there
+            self._cursor = 0
+            if not self._at_waypoint(current_position, 0):
+                return tuple(self.plan.latlon[0].tolist())
+        elif not self._at_waypoint(current_position, self._cursor):
             print("Previous waypoint may not be correct")
             return None
 
+        if self._cursor + 1 >= len(self.plan):
+            return None
+        self._cursor += 1
+        return tuple(self.plan.latlon[self._cursor].tolist())
+
+class OutwardSpiralPathFinder(CoveragePathFinder):
+    """Spirals outwards from the starting position, ring by ring, over `n_rings` rings."""
+    def __init__(self, res: int, centre: tuple, n_rings: int = N_RINGS_CLUSTER):
+        centre_cell = h3_int.geo_to_h3(centre[0], centre[1], res)
+        super().__init__(res, centre, spiral_plan(centre_cell, n_rings))
+
+class ZigzagPathFinder(CoveragePathFinder):
+    """Sweeps the `n_rings` rings around the starting position row by row, in alternating directions."""
+    def __init__(self, res: int, centre: tuple, n_rings: int = N_RINGS_CLUSTER):
+        centre_cell = h3_int.geo_to_h3(centre[0], centre[1], res)
+        super().__init__(res, centre, zigzag_plan(centre_cell, n_rings))
+
 class BayesianHexSearch(PathFinder):
     """A pathfinding algorithm in the H3 hexagonal grid system using probability.
     """
@@ -280,41 +327,148 @@ class BayesianHexSearch(PathFinder):
         """
         super().__init__(res, center)
         self.trajectory = []
+        self._last_step: Tuple[Tuple[float, float], ClusterGeometry, int] = None  # (position, geometry of map, slot)
+
+    def _position_ij(self, current_position: tuple[float, float], prob_map: ProbabilityMap) -> Tuple[int, int]:
+        """Local IJ coordinates of the hexagon at `current_position` in `prob_map`.
+        Raises `ValueError` if the position is too far from the map to have local IJ coordinates.
+        """
+        cell = h3_int.geo_to_h3(current_position[0], current_position[1], self.res)
+        return h3_int.experimental_h3_to_local_ij(prob_map.centre_cell, cell)
+
+    def _candidate_slots(self, current_position: tuple[float, float], prob_map: ProbabilityMap) -> Tuple[Tuple[int, int], np.ndarray]:
+        """Slots of the hexagon at `current_position` and its neighbours that are in `prob_map`.
+        Returns the local IJ coordinates of the position (None if it was returned by the previous step) and the slots.
+        Raises `ValueError` if the position is too far from the map to have local IJ coordinates.
+        """
+        geometry = prob_map.geometry
+        last_step = self._last_step
+        if last_step is not None and last_step[0] == tuple(current_position) and last_step[1] is geometry:
+            neighbour_slots = geometry.neighbour_slots[last_step[2]]
+            return None, neighbour_slots[neighbour_slots >= 0]
+
+        curr_ij = self._position_ij(current_position, prob_map)
+        curr_slot = geometry.slot_at_ij(*curr_ij)
+        if curr_slot >= 0:
+            neighbour_slots = geometry.neighbour_slots[curr_slot]
+        else:
+            neighbour_slots = geometry.slots_at_ij(np.add(curr_ij, NEIGHBOUR_OFFSETS))
+        return curr_ij, neighbour_slots[neighbour_slots >= 0]
 
-    def find_next_step(self, current_position: tuple[float, float], prob_map: dict) -> tuple[int, int]:
+    def _choose_slot(self, slots: np.ndarray, max_slot: int, prob_map: ProbabilityMap) -> int:
+        """Scores the candidate slots against the slot of the highest probability, and returns the best one."""
+        offsets = prob_map.latlon[slots] - prob_map.latlon[max_slot]
+        dist = np.sqrt(np.einsum("nk,nk->n", offsets, offsets))
+        score = 1/(1+dist) * 2 + prob_map.weights_of(slots) * 1
+        return int(slots[score.argmax()])
+
+    def find_next_step(self, current_position: tuple[float, float], prob_map: ProbabilityMap) -> tuple[int, int]:
         """Determines the next waypoint based on current position and a probability map.
+        Neighbours and distances are looked up from the geometry of the map, by slot. H3 is only called to locate
+        a position that was not returned by the previous step, e.g. at the start of the search.
 
         Args:
             current_position (tuple[float, float]): Current position as a tuple of (latitude, longitude).
         Returns:
             tuple[int, int]: Next waypoint as a tuple of (latitude, longitude).
         """
-        # Initialise current position
-        curr_hexagon = h3.geo_to_h3(
-            current_position[0], current_position[1], resolution=self.res)
-
-        # Hex index of the highest probability
-        max_hex_index = max(prob_map, key=lambda key: prob_map[key])
-
-        # Get neighbours
-        neighbours = h3.k_ring(curr_hexagon, 1)
-
-        # Initialise variables to find the nest best neighbour
-        path_to_max = h3.h3_line(curr_hexagon, max_hex_index)
-        # print(f'Prob map: {prob_map}')
-        # print(f'Path:{path_to_max}, current {h3.h3_to_geo(curr_hexagon)}, max: {h3.h3_to_geo(max_hex_index)}')
-        best_neighbour = path_to_max[1] if len(path_to_max)>1 else max_hex_index
-        highest_score = 0
-
-        for neighbour in neighbours:
-            if neighbour not in prob_map:
-                continue
-            dist = distance_between_2_hexas(neighbour, max_hex_index)
-            neighbour_prob = prob_map[neighbour]
-            score = 1/(1+dist) * 2 + neighbour_prob * 1
-
-            if score > highest_score:
-                best_neighbour = neighbour
-                highest_score = score
-
-        return h3.h3_to_geo(best_neighbour)
\ No newline at end of file
+        geometry = prob_map.geometry
+
+        # Slot of the highest probability
+        max_slot = prob_map.argmax_slot()
+
+        # Get neighbours (including the current hexagon), as slots in the map
+        try:
+            curr_ij, slots = self._candidate_slots(current_position, prob_map)
+        except ValueError:
+            # Too far from the map for local IJ coordinates, so head towards the highest probability with H3
+            curr_cell = h3_int.geo_to_h3(current_position[0], current_position[1], self.res)
+            path_to_max = h3_int.h3_line(curr_cell, int(prob_map.cells[max_slot]))
+            return cell_centroid(path_to_max[1] if len(path_to_max)>1 else path_to_max[0])
+
+        if len(slots) > 0:
+            # Score the neighbours in the map, and take the best one
+            next_slot = self._choose_slot(slots, max_slot, prob_map)
+        else:
+            # Otherwise the drone is outside the map, so take the next hexagon on the line to the highest probability
+            path_to_max = hex_line_ij(curr_ij, prob_map.local_ij[max_slot])
+            next_ij = path_to_max[1] if len(path_to_max)>1 else path_to_max[0]
+            next_slot = geometry.slot_at_ij(*next_ij)
+            if next_slot < 0:
+                return cell_centroid(h3_int.experimental_local_ij_to_h3(prob_map.centre_cell, *next_ij))
+
+        next_position = tuple(prob_map.latlon[next_slot].tolist())
+        self._last_step = (next_position, geometry, next_slot)
+        return next_position
+
+class LookaheadHexSearch(BayesianHexSearch):
+    """Receding-horizon variant of `BayesianHexSearch`.
+    Paths of `horizon` steps are planned with a beam search, and the drone takes the first step of the best path.
+    The planner is run again at every step, against the updated map.
+
+    A path is scored by its expected detection, i.e. the sum of `f` times the probability of each hexagon it
+    visits, with the Bayesian update for a miss applied along the path: the probability of a hexagon that the
+    path has already visited `n` times is scaled by `(1-f)**n`. The probabilities are left unnormalised, so that
+    the scores of different paths are comparable. The updates along a path only depend on the number of times it
+    visits each hexagon, so paths are stored as arrays of slots and the map is never copied.
+
+    Paths are ranked by their score plus a heuristic for the steps after the horizon, which charges
+    `distance_cost` times the best expected detection in the map for each step between the end of the path and
+    the highest probability. This keeps the drone heading towards the highest probability when there is none
+    nearby, without pulling it away from a peak that it has not finished searching. At each depth, the beam is
+    pruned to the best path ending at each hexagon, and then to the `beam_width` best paths.
+    """
+
+    def __init__(self, res: int, center: tuple, f: float = PROBABILITY_DECAY, horizon: int = LOOKAHEAD_HORIZON,
+            beam_width: int = LOOKAHEAD_BEAM_WIDTH, distance_cost: float = LOOKAHEAD_DISTANCE_COST) -> None:
+        """
+        Args:
+            res (int): The H3 resolution for the hexagonal grid.
+            center (tuple[float, float]): Starting position as a tuple of (latitude, longitude).
+            f (float): Probability of finding a person in a hexagon, if they are there.
+            horizon (int): Number of steps planned ahead.
+            beam_width (int): Number of paths kept at each depth of the search.
+            distance_cost (float): Cost of each step to the highest probability after the horizon, as a fraction
+                of the expected detection there.
+        """
+        super().__init__(res, center)
+        self.f = f
+        self.horizon = max(int(horizon), 1)
+        self.beam_width = max(int(beam_width), 1)
+        self.distance_cost = distance_cost
+
+    def _choose_slot(self, slots: np.ndarray, max_slot: int, prob_map: ProbabilityMap) -> int:
+        """Returns the first slot of the best path found by the beam search, starting at the candidate slots."""
+        neighbour_slots = prob_map.geometry.neighbour_slots
+        f = self.f
+
+        paths = slots[:, None].astype(np.int64)     # Slots visited by each path, of shape (beam, depth)
+        scores = f * prob_map.weights_of(slots)
+        paths, scores, ranks = self._prune(paths, scores, max_slot, prob_map)
+        for _ in range(1, self.horizon):
+            # Extend each path by each neighbour of its last hexagon
+            candidates = neighbour_slots[paths[:, -1]]
+            valid = candidates >= 0
+            candidates = np.where(valid, candidates, 0)
+            visits = (paths[:, None, :] == candidates[:, :, None]).sum(axis=2)
+            gain = f * prob_map.weights_of(candidates) * (1-f)**visits
+            parent, child = np.nonzero(valid)
+            paths = np.concatenate((paths[parent], candidates[parent, child, None]), axis=1)
+            paths, scores, ranks = self._prune(paths, scores[parent] + gain[parent, child], max_slot, prob_map)
+        return int(paths[ranks.argmax(), 0])
+
+    def _prune(self, paths: np.ndarray, scores: np.ndarray, max_slot: int,
+            prob_map: ProbabilityMap) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Keeps the best path ending at each hexagon, and then the `beam_width` best paths.
+        Paths are ranked by their score plus the heuristic for the steps after the horizon. Ties are broken in
+        favour of the earlier path, so that the search is deterministic.
+        Returns the paths that are kept, with their scores and ranks.
+        """
+        max_detection = self.f * prob_map.weights_of(max_slot) * (1-self.f)**(paths == max_slot).sum(axis=1)
+        ij_offsets = prob_map.local_ij[max_slot] - prob_map.local_ij[paths[:, -1]]
+        ranks = scores - self.distance_cost * max_detection * hex_grid_distance(ij_offsets[:, 0], ij_offsets[:, 1])
+
+        order = np.argsort(-ranks, kind="stable")
+        _, first = np.unique(paths[order, -1], return_index=True)
+        keep = order[np.sort(first)[:self.beam_width]]
+        return paths[keep], scores[keep], ranks[keep]
@@ -0,0 +1,314 @@
+"""
+probability_map:
+Array-backed probability map used by the pathfinder.
+
+Each hexagon in the map is assigned a fixed slot, and probabilities are stored in NumPy float64 vectors indexed by
+slot. This allows operations over the whole map (e.g. argmax) to run as vectorised NumPy operations instead of
+dictionary comprehensions.
+
+The weights of a map are held copy-on-write: a read-only prior vector, which is shared with the copies of the map,
+and a sparse overlay of the slots that the map has updated since, appended in order of first update and indexed by a
+dictionary of slot to position. Copying a map (e.g. for the simulated path of a drone) only copies the overlay, and
+the map and its copies only store the cells that each of them has updated.
+
+The weights are unnormalised: the probability of a slot is its weight multiplied by a global scale factor, and a
+running total of the weights is kept. Normalising the map and applying a Bayesian update to a single slot are
+therefore O(1) in the size of the map, and probabilities are only materialised when they are read.
+
+The slot with the highest weight is found by walking the slots of the prior in descending order of weight, skipping
+those in the overlay, and comparing the first one with the largest weight in the overlay. The order of the prior is
+computed once and shared, and the walk only moves forward. The largest weight in the overlay is kept in a heap of
+(-weight, slot), to which every update pushes an entry. Entries whose weight is no longer that of their slot are
+discarded when they reach the top (lazy deletion), so an update is O(log n) and an argmax query is amortised
+O(log n).
+
+Hexagons are identified by integer H3 indices (`cells`). String H3 indices are accepted and returned by the
+dictionary interface, for callers at the API/JSON boundary.
+"""
+from collections.abc import MutableMapping
+from heapq import heapify, heappop, heappush
+from typing import Dict, Iterable, Iterator, List, Tuple, Union
+
+import numpy as np
+
+from pathfinder.geometry import ClusterGeometry, to_cell
+
+RESCALE_LIMIT = 1e100    # Largest scale factor before it is folded back into the weights
+OVERLAY_CAPACITY = 64    # Initial capacity of the overlay, which doubles when it is full
+HEAP_SLACK = 64          # Stale heap entries allowed beyond the size of the overlay, before the heap is rebuilt
+
+class _Prior:
+    """ Read-only weights shared by a map and its copies. """
+    def __init__(self, weights: np.ndarray):
+        self.weights = weights
+        self.weights.flags.writeable = False
+        self.total = float(weights.sum())
+        self._order: np.ndarray = None
+
+    @property
+    def order(self) -> np.ndarray:
+        """ Slots in descending order of weight, with ties in ascending slot order. Computed on first use. """
+        if self._order is None:
+            self._order = np.argsort(-self.weights, kind="stable")
+            self._order.flags.writeable = False
+        return self._order
+
+class ProbabilityMap(MutableMapping):
+    """
+    Probability map over a fixed set of H3 hexagons.
+    - `slot_of()` maps a H3 index to its slot in the probability vector.
+    - `cells`, `latlon` and `local_ij` map a slot back to its integer H3 index, centre coordinates (lat, lon)
+    and local IJ coordinates relative to `centre_cell`.
+    - The map behaves as a `Dict[str, float]`, so existing callers (e.g. the visualisation code) can use it as one.
+    Hexagons cannot be added to or removed from the map after it is created.
+    """
+    def __init__(self, geometry: ClusterGeometry, values: np.ndarray = None):
+        """
+        - `geometry`: The hexagons in the map. This is shared, and not copied.
+        - `values`: Initial probability of each slot. Defaults to zero.
+        """
+        self.geometry = geometry
+        self.cells = geometry.cells
+        self.centre_cell = geometry.centre_cell
+        self.latlon = geometry.latlon
+        self.local_ij = geometry.local_ij
+
+        if values is None:
+            weights = np.zeros(len(self.cells), dtype=np.float64)
+        else:
+            weights = np.array(values, dtype=np.float64)
+        self._scale = 1.0
+        self._set_prior(weights)
+
+    @staticmethod
+    def from_hexes(hexes: Iterable[Union[str, int]], centre_hex: Union[str, int] = None, values: np.ndarray = None) -> 'ProbabilityMap':
+        """
+        Creates a probability map over the given hexagons.
+        - `hexes`: H3 indices of the hexagons in the map, in slot order.
+        - `centre_hex`: Reference hexagon for local IJ coordinates. Defaults to the first hexagon.
+        """
+        return ProbabilityMap(ClusterGeometry.from_hexes(hexes, centre_hex), values)
+
+    @property
+    def hexes(self) -> Tuple[str, ...]:
+        """ String H3 index of each slot. """
+        return self.geometry.hexes
+
+    @property
+    def centre_hex(self) -> str:
+        return self.geometry.centre_hex
+
+    def _set_prior(self, weights: np.ndarray):
+        """ Replaces the weights of the map with `weights`, which it takes ownership of, and clears the overlay. """
+        self._prior = _Prior(weights)
+        # The overlay holds `_overlay_size` slots in order of first update, followed by unused capacity
+        self._overlay_slots = np.zeros(OVERLAY_CAPACITY, dtype=np.int64)
+        self._overlay_weights = np.zeros(OVERLAY_CAPACITY, dtype=np.float64)
+        self._overlay_size = 0
+        self._overlay_index: Dict[int, int] = {}    # Position of each slot in the overlay
+        self._heap: List[Tuple[float, int]] = []    # (-weight, slot) of the overlay, with stale entries
+        self._order_pos = 0     # Slots of the prior before this position in its order are all in the overlay
+        self._reset_total()
+
+    def _reset_total(self):
+        """ Recomputes the running total of the weights exactly. """
+        size = self._overlay_size
+        overlaid = self._prior.weights[self._overlay_slots[:size]]
+        self._total = self._prior.total + float(self._overlay_weights[:size].sum() - overlaid.sum())
+        self._exact_total = self._total
+
+    def _overlay_pos(self, slot: int) -> int:
+        """ Position of `slot` in the overlay, or -1 if it is not in it. """
+        return self._overlay_index.get(int(slot), -1)
+
+    def _weight(self, slot: int) -> float:
+        pos = self._overlay_pos(slot)
+        return float(self._overlay_weights[pos] if pos >= 0 else self._prior.weights[slot])
+
+    def _set_weight(self, slot: int, weight: float):
+        """ Sets the weight of a slot in the overlay, without updating the running total. """
+        slot, weight = int(slot), float(weight)
+        pos = self._overlay_index.get(slot)
+        if pos is None:
+            pos = self._overlay_size
+            if pos == len(self._overlay_slots):
+                self._overlay_slots = np.concatenate((self._overlay_slots, np.zeros(pos, dtype=np.int64)))
+                self._overlay_weights = np.concatenate((self._overlay_weights, np.zeros(pos, dtype=np.float64)))
+            self._overlay_slots[pos] = slot
+            self._overlay_index[slot] = pos
+            self._overlay_size = pos + 1
+        self._overlay_weights[pos] = weight
+        heappush(self._heap, (-weight, slot))
+        if len(self._heap) > 2 * self._overlay_size + HEAP_SLACK:
+            self._rebuild_heap()
+
+    def _rebuild_heap(self):
+        """ Rebuilds the heap from the overlay, dropping its stale entries. """
+        size = self._overlay_size
+        self._heap = list(zip((-self._overlay_weights[:size]).tolist(), self._overlay_slots[:size].tolist()))
+        heapify(self._heap)
+
+    def _overlay_max(self) -> Tuple[float, int]:
+        """ Returns the largest weight in the overlay and its slot (the lowest slot on ties). The overlay must not be empty. """
+        heap, index, weights = self._heap, self._overlay_index, self._overlay_weights
+        while True:
+            neg_weight, slot = heap[0]
+            if weights[index[slot]] == -neg_weight:
+                return -neg_weight, slot
+            heappop(heap)
+
+    def _dense_weights(self) -> np.ndarray:
+        """ Returns the weight of each slot as a new array. """
+        weights = self._prior.weights.copy()
+        weights[self._overlay_slots[:self._overlay_size]] = self._overlay_weights[:self._overlay_size]
+        return weights
+
+    def probabilities(self) -> np.ndarray:
+        """ Returns the probability of each slot as a new array. """
+        return self._dense_weights() * self._scale
+
+    def add_probabilities(self, delta: np.ndarray):
+        """ Adds `delta`, an array of probabilities indexed by slot, to the map. """
+        self._set_prior(self._dense_weights() + np.asarray(delta, dtype=np.float64) / self._scale)
+
+    def slot_of(self, h3_index: Union[str, int]) -> int:
+        """ Returns the slot of a hexagon, as a string or integer H3 index, raising `KeyError` if it is not in the map. """
+        try:
+            slot = self.geometry.slot_of_cell(to_cell(h3_index))
+        except (ValueError, OverflowError):
+            slot = -1
+        if slot < 0:
+            raise KeyError(f"Hexagon {h3_index} is not in the probability map")
+        return slot
+
+    def slots_of(self, cells: np.ndarray) -> np.ndarray:
+        """ Returns the slot of each of the given integer H3 indices, or -1 for those not in the map. """
+        return self.geometry.slots_of(cells)
+
+    def weights_of(self, slots: np.ndarray) -> np.ndarray:
+        """ Returns the probability of each of the given slots. """
+        weights = self._prior.weights[slots]
+        if self._overlay_size > 0:
+            slots = np.asarray(slots)
+            index = self._overlay_index
+            pos = np.fromiter((index.get(slot, -1) for slot in slots.ravel().tolist()), dtype=np.int64, count=slots.size).reshape(slots.shape)
+            weights = np.where(pos >= 0, self._overlay_weights[pos], weights)
+        return weights * self._scale
+
+    def total(self) -> float:
+        """ Sum of all probabilities in the map. """
+        return self._total * self._scale
+
+    def normalise(self) -> bool:
+        """
+        Normalises the map so that it sums to 1. Returns False if the map is entirely zero.
+        - Normalisation only updates the global scale factor, and is therefore O(1).
+        """
+        if self._total <= 0:
+            return False
+        self._scale = 1 / self._total
+        if self._scale > RESCALE_LIMIT:
+            # Fold the scale factor into the weights before they underflow
+            self._set_prior(self._dense_weights() * self._scale)
+            self._scale = 1 / self._total
+        return True
+
+    def argmax_slot(self) -> int:
+        """ Slot of the hexagon with the highest probability, with ties broken in favour of the lowest slot. """
+        # Highest weight of the prior among the slots that are not in the overlay
+        order, prior_weights, index = self._prior.order, self._prior.weights, self._overlay_index
+        pos = self._order_pos
+        while pos < len(order) and int(order[pos]) in index:
+            pos += 1
+        self._order_pos = pos
+        if self._overlay_size == 0:
+            return int(order[pos])
+
+        # Highest weight in the overlay. Heap entries compare by slot on ties, so ties go to the lowest slot.
+        best_weight, best_slot = self._overlay_max()
+        if pos == len(order):
+            return best_slot
+        prior_slot = int(order[pos])
+        prior_weight = prior_weights[prior_slot]
+        if prior_weight > best_weight or (prior_weight == best_weight and prior_slot < best_slot):
+            return prior_slot
+        return best_slot
+
+    def argmax(self) -> str:
+        """ H3 index of the hexagon with the highest probability. """
+        return self.hexes[self.argmax_slot()]
+
+    def argmax_cell(self) -> int:
+        """ Integer H3 index of the hexagon with the highest probability. """
+        return int(self.cells[self.argmax_slot()])
+
+    def bayes_update(self, slot: int, f: float) -> bool:
+        """
+        Applies a Bayesian update to a slot given that nothing was found there, then normalises the map.
+        - `f`: Probability of finding a person in the hexagon, if they are there.
+        Returns False if the map is entirely zero after the update.
+
+        Only the weight of the slot and the running total change, so the update is O(1) in the size of the map.
+        """
+        weight = self._weight(slot)
+        prior = weight * self._scale
+        posterior = prior*(1-f) / (1-prior*f)
+        new_weight = posterior / self._scale
+        self._set_weight(slot, new_weight)
+        self._total += new_weight - weight
+        if self._total < self._exact_total * 0.5:
+            # The rounding error of the running total is relative to the last exact total, so recompute it
+            # once the total has halved
+            self._reset_total()
+        return self.normalise()
+
+    def copy(self) -> 'ProbabilityMap':
+        """
+        Returns a copy of the map. The (immutable) geometry and prior of the map are shared with the copy, so only
+        the slots that the map has updated are copied.
+        """
+        ret = ProbabilityMap.__new__(ProbabilityMap)
+        ret.__dict__.update(self.__dict__)
+        ret._overlay_slots = self._overlay_slots.copy()
+        ret._overlay_weights = self._overlay_weights.copy()
+        ret._overlay_index = self._overlay_index.copy()
+        ret._heap = self._heap.copy()
+        return ret
+
+    def __deepcopy__(self, memo) -> 'ProbabilityMap':
+        return self.copy()
+
+    def to_dict(self) -> Dict[str, float]:
+        """ Returns the map as a plain dictionary of H3 index to probability. """
+        return dict(zip(self.hexes, self.probabilities().tolist()))
+
+    # Dictionary interface
+    def __getitem__(self, h3_index: Union[str, int]) -> float:
+        return self._weight(self.slot_of(h3_index)) * self._scale
+
+    def __setitem__(self, h3_index: Union[str, int], value: float):
+        slot = self.slot_of(h3_index)
+        weight = float(value) / self._scale
+        self._total += weight - self._weight(slot)
+        self._set_weight(slot, weight)
+
+    def __delitem__(self, h3_index: str):
+        raise TypeError("Hexagons cannot be removed from a ProbabilityMap")
+
+    def __contains__(self, h3_index: object) -> bool:
+        if not isinstance(h3_index, (str, int, np.integer)):
+            return False
+        try:
+            self.slot_of(h3_index)
+        except KeyError:
+            return False
+        return True
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.hexes)
+
+    def __len__(self) -> int:
+        return len(self.cells)
+
+    def __repr__(self) -> str:
+        return f"ProbabilityMap({len(self.cells)} hexagons, centre {self.centre_hex})"
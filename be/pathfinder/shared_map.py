@@ -0,0 +1,116 @@
+"""
+shared_map:
+Mission-level probability maps shared by the drones of a mission.
+
+Drones tasked with the same cluster (same centre, rings and hotspots) share one `SharedProbabilityMap`, so that each
+drone plans against the cells its peers have already searched, and only one map is held in memory per cluster.
+The Bayesian miss-update for a searched cell is also posted to every other live shared map that contains it, so that
+drones searching overlapping clusters do not re-search each other's cells. Maps are indexed by the parent cells of
+their cells at `INDEX_RESOLUTION`, so a miss is only posted to the maps that may contain it.
+
+Each shared map has its own lock, which is held while a drone plans its next step and updates the map. Drones
+searching different clusters therefore do not contend with each other, and no two map locks are ever held at once.
+The lock of the service is only held to look up maps, and never while a map is built or updated.
+"""
+from threading import Lock
+from typing import Dict, List, Tuple
+from weakref import WeakSet, WeakValueDictionary
+
+import h3.api.basic_int as h3_int
+
+from maplib import LatLon
+from pathfinder.pathfinder import DEFAULT_RESOLUTION, PathFinder, init_empty_prob_map, update_prob_map_w_hotspots
+from pathfinder.probability_map import ProbabilityMap
+
+INDEX_RESOLUTION = 10  # H3 resolution of the parent cells by which maps are indexed, a few of which cover a cluster
+
+class SharedProbabilityMap:
+    """
+    A probability map shared by the drones searching a cluster. It is only accessed under its lock.
+    - `prob_map`: The shared map. Use `snapshot()` to read it outside of `step()`.
+    """
+    def __init__(self, prob_map: ProbabilityMap, service: 'ProbabilityMapService'):
+        self.prob_map = prob_map
+        self._service = service
+        self._lock = Lock()
+
+    def _miss(self, cell: int, f: float):
+        """ Applies the Bayesian update for a miss at `cell`, if it is in the map. The lock must be held. """
+        slot = self.prob_map.geometry.slot_of_cell(cell)
+        if slot >= 0 and not self.prob_map.bayes_update(slot, f):
+            print("Entire probability map is zero")
+
+    def step(self, pathfinder: PathFinder, current_position: Tuple[float, float], f: float) -> Tuple[float, float]:
+        """
+        Finds the next step of a drone with `pathfinder`, and posts the miss at that step to the map and to the
+        other maps that contain it. Returns None if the pathfinder has finished its search.
+        - `f`: Probability of finding a person in a hexagon, if they are there.
+        """
+        with self._lock:
+            next_tup = pathfinder.find_next_step(current_position, self.prob_map)
+            if next_tup is None:
+                return None
+            cell = h3_int.geo_to_h3(next_tup[0], next_tup[1], pathfinder.res)
+            self._miss(cell, f)
+        self._service.post_miss(cell, f, source=self)
+        return next_tup
+
+    def post_miss(self, cell: int, f: float):
+        """ Applies the Bayesian update for a miss at `cell`, an integer H3 index, if it is in the map. """
+        with self._lock:
+            self._miss(cell, f)
+
+    def snapshot(self) -> ProbabilityMap:
+        """ Returns a copy of the map, which only copies the cells updated since its prior. """
+        with self._lock:
+            return self.prob_map.copy()
+
+class ProbabilityMapService:
+    """
+    Hands out the shared probability map of each cluster, and relays miss-updates between overlapping maps.
+    Maps are only kept while a drone holds them.
+    """
+    def __init__(self):
+        self._maps: WeakValueDictionary = WeakValueDictionary()
+        self._index: Dict[int, WeakSet] = {}    # Maps with a cell in each parent cell at `INDEX_RESOLUTION`
+        self._lock = Lock()
+
+    def cluster_map(self, centre_pos: LatLon, n_rings: int, hotspots: List[Tuple[float, float]]) -> SharedProbabilityMap:
+        """ Returns the shared map of the cluster, creating it from its hotspots if no drone is searching it. """
+        key = (h3_int.geo_to_h3(centre_pos.lat, centre_pos.lon, DEFAULT_RESOLUTION), n_rings, tuple(map(tuple, hotspots)))
+        with self._lock:
+            shared_map = self._maps.get(key)
+        if shared_map is not None:
+            return shared_map
+
+        # The map is built without the lock, so that other drones keep relaying their misses meanwhile. If another
+        # drone built the same map in the meantime, theirs is kept.
+        prob_map = update_prob_map_w_hotspots(init_empty_prob_map(centre_pos, n_rings), hotspots)
+        parents = {h3_int.h3_to_parent(int(cell), INDEX_RESOLUTION) for cell in prob_map.cells}
+        with self._lock:
+            shared_map = self._maps.get(key)
+            if shared_map is None:
+                shared_map = SharedProbabilityMap(prob_map, self)
+                self._maps[key] = shared_map
+                for parent in parents:
+                    self._index.setdefault(parent, WeakSet()).add(shared_map)
+        return shared_map
+
+    def post_miss(self, cell: int, f: float, source: SharedProbabilityMap = None):
+        """ Posts the miss at `cell`, an integer H3 index, to every shared map other than `source` that contains it. """
+        parent = h3_int.h3_to_parent(cell, INDEX_RESOLUTION)
+        with self._lock:
+            indexed = self._index.get(parent)
+            if indexed is None:
+                return
+            shared_maps = [shared_map for shared_map in indexed if shared_map is not source]
+            if not shared_maps and not indexed:
+                # Every map in the parent cell has been released
+                del self._index[parent]
+        for shared_map in shared_maps:
+            # The geometry of a map is immutable, so its cells are checked before its lock is taken
+            if shared_map.prob_map.geometry.slot_of_cell(cell) >= 0:
+                shared_map.post_miss(cell, f)
+
+    def __len__(self) -> int:
+        return len(self._maps)
@@ -1,7 +1,12 @@
+import math
+from typing import Union
+
 import numpy as np
 import h3  # Assuming you're using the h3 library for hexagons
 from scipy.spatial.distance import euclidean
 
+from pathfinder.geometry import NEIGHBOUR_OFFSETS, hex_centroid
+
 def hex_to_binary(hex_string):
     try:
         # Remove the '0x' prefix if it exists
@@ -51,46 +56,99 @@ def binary_to_hex(binary_string):
     except ValueError:
         return "Invalid binary input"
 
-def hex_to_array_index(hex_string: str, prob_map: np.ndarray) -> tuple[int, int, int, int]:
-    """Convert a hexagon's H3 string index into an array index.
+def hex_to_array_index(hex_string: Union[str, int], prob_map: np.ndarray) -> tuple[int, int, int, int]:
+    """Convert a hexagon's H3 index into an array index.
+    The array index is made up of the last `prob_map.ndim` digits (3 bits each) of the H3 index.
 
     Args:
-        hex_string (str): The H3 index of the hexagon in string.
+        hex_string (Union[str, int]): The H3 index of the hexagon, as a string or an integer.
         prob_map (np.ndarray): A numpy array of (7,7,7,7) representing the probability in each hexagon.
 
     Returns:
         tuple[int, int, int, int]: Corresponding indices in the `prob_map` for the given hexagon.
     """
-    binary_input = hex_to_binary(hex_string)
-    octal_output = binary_to_octal_list(binary_input, len(prob_map.shape))
-    return tuple(octal_output)
+    cell = int(hex_string, 16) if isinstance(hex_string, str) else int(hex_string)
+    n_digits = len(prob_map.shape)
+    return tuple((cell >> (3 * (n_digits - 1 - k))) & 0b111 for k in range(n_digits))
 
-def array_index_to_hex(centre_hex: str, indices: tuple[int, int, int, int] ,prob_map: np.ndarray) -> str:
-    """Convert a array index of size 4 into the corresponding hexagon's H3 string index.
+def array_index_to_hex(centre_hex: Union[str, int], indices: tuple[int, int, int, int] ,prob_map: np.ndarray) -> Union[str, int]:
+    """Convert a array index of size 4 into the corresponding hexagon's H3 index.
 
     Args:
-        centre_hex (str): The H3 index of the central reference hexagon in string format needed for the prefix.
+        centre_hex (Union[str, int]): The H3 index of the central reference hexagon needed for the prefix, as a string or an integer.
         indices (tuple[int, int, int, int]): Indices of size 4 in the `prob_map` to be converted.
         prob_map (np.ndarray): A numpy array of (7,7,7,7) representing the probability in each hexagon.
 
     Returns:
-        str: The corresponding H3 index of the given array indices.
+        Union[str, int]: The corresponding H3 index of the given array indices, in the same form as `centre_hex`.
     """
-    centre_bin = hex_to_binary(centre_hex)
-    bin_prefix = centre_bin[:-len(prob_map.shape) * 3]
-    hex_binary = bin_prefix + octal_list_to_binary(indices)
-    hex_idx = binary_to_hex(hex_binary)
-    return hex_idx
+    centre = int(centre_hex, 16) if isinstance(centre_hex, str) else int(centre_hex)
+    n_bits = 3 * len(prob_map.shape)
+    cell = (centre >> n_bits) << n_bits
+    for digit in indices:
+        n_bits -= 3
+        cell |= (int(digit) & 0b111) << n_bits
+    return format(cell, 'x') if isinstance(centre_hex, str) else cell
 
-def distance_between_2_hexas(a: str, b: str) -> float:
+def distance_between_2_hexas(a: Union[str, int], b: Union[str, int]) -> float:
     """Calculate the Euclidean distance between the centers of two hexagons.
 
     Args:
-        a (str): The H3 index of the first hexagon in string.
-        b (str): The H3 index of the second hexagon in string.
+        a (Union[str, int]): The H3 index of the first hexagon, as a string or an integer.
+        b (Union[str, int]): The H3 index of the second hexagon, as a string or an integer.
 
     Returns:
         float: The Euclidean distance between the two hexagon centers using latitude and longitude in the unit of the input
     """
-    dist = euclidean(h3.h3_to_geo(a), h3.h3_to_geo(b))
-    return dist
\ No newline at end of file
+    dist = euclidean(hex_centroid(a), hex_centroid(b))
+    return dist
+
+def hex_grid_distance(di: np.ndarray, dj: np.ndarray) -> np.ndarray:
+    """Calculate the grid distance (number of hexagons) between hexagons, given the difference in their local IJ coordinates.
+
+    Args:
+        di (np.ndarray): Difference in the I coordinates of the hexagons.
+        dj (np.ndarray): Difference in the J coordinates of the hexagons.
+
+    Returns:
+        np.ndarray: The grid distance between the hexagons, equal to `h3.h3_distance` for hexagons in the same local IJ system.
+    """
+    di, dj = np.asarray(di), np.asarray(dj)
+    same_sign = (di >= 0) == (dj >= 0)
+    return np.where(same_sign, np.maximum(np.abs(di), np.abs(dj)), np.abs(di) + np.abs(dj))
+
+def _cube_round(i: float, j: float, k: float) -> tuple[int, int, int]:
+    """Round fractional cube coordinates to the nearest hexagon, rounding halves away from zero like C's `lround`."""
+    ri, rj, rk = (int(math.copysign(math.floor(abs(v) + 0.5), v)) for v in (i, j, k))
+    i_diff, j_diff, k_diff = abs(ri - i), abs(rj - j), abs(rk - k)
+    # Round, maintaining valid cube coordinates
+    if i_diff > j_diff and i_diff > k_diff:
+        ri = -rj - rk
+    elif j_diff > k_diff:
+        rj = -ri - rk
+    else:
+        rk = -ri - rj
+    return ri, rj, rk
+
+def hex_line_ij(start: tuple[int, int], end: tuple[int, int]) -> list[tuple[int, int]]:
+    """Calculate the line of hexagons between two hexagons in local IJ coordinates.
+
+    Args:
+        start (tuple[int, int]): Local IJ coordinates of the first hexagon.
+        end (tuple[int, int]): Local IJ coordinates of the last hexagon.
+
+    Returns:
+        list[tuple[int, int]]: Local IJ coordinates of the hexagons along the line, including both ends. This is the
+        same line as `h3.h3_line` for hexagons in the same local IJ system.
+    """
+    start, end = (int(start[0]), int(start[1])), (int(end[0]), int(end[1]))
+    distance = int(hex_grid_distance(end[0] - start[0], end[1] - start[1]))
+    # Cube coordinates (x, y, z) of a hexagon at (i, j) are (-i, j, i-j), as in H3
+    start_cube = (-start[0], start[1], start[0] - start[1])
+    end_cube = (-end[0], end[1], end[0] - end[1])
+    steps = [(e - s) / distance if distance else 0.0 for s, e in zip(start_cube, end_cube)]
+    line = []
+    for n in range(distance + 1):
+        x, y, _ = _cube_round(*(s + step * n for s, step in zip(start_cube, steps)))
+        line.append((-x, y))
+    return line
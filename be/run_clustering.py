@@ -3,6 +3,7 @@ from typing import Dict, List, Set, Tuple
 
 from clusterfinder.point import Point
 from clusterfinder.clusterfinder import DIANAClusterFinder
+from clusterfinder.maplib import distances, to_arrays
 
 
 def run_clustering(hotspots_locations: List[Tuple], threshold=0.1) -> Dict[int, object]:
@@ -46,21 +47,13 @@ def find_search_centre(cluster: List[Point]) -> Tuple[Tuple[float, float], float
         raise ValueError("The cluster is empty")
 
     # Convert all points to Cartesian coordinates
-    x, y, z = 0.0, 0.0, 0.0
-
-    for point in cluster:
-        latitude = np.radians(point.coordinates[0])
-        longitude = np.radians(point.coordinates[1])
-
-        x += np.cos(latitude) * np.cos(longitude)
-        y += np.cos(latitude) * np.sin(longitude)
-        z += np.sin(latitude)
+    lats, lons = to_arrays(point.latlon for point in cluster)
+    latitudes, longitudes = np.radians(lats), np.radians(lons)
 
     # Compute average coordinates
-    total_points = len(cluster)
-    x /= total_points
-    y /= total_points
-    z /= total_points
+    x = np.mean(np.cos(latitudes) * np.cos(longitudes))
+    y = np.mean(np.cos(latitudes) * np.sin(longitudes))
+    z = np.mean(np.sin(latitudes))
 
     # Convert average coordinates back to latitude and longitude
     central_longitude = np.arctan2(y, x)
@@ -68,14 +61,10 @@ def find_search_centre(cluster: List[Point]) -> Tuple[Tuple[float, float], float
     central_latitude = np.arctan2(z, central_square_root)
 
     # Convert radians back to degrees
-    central_latitude = np.degrees(central_latitude)
-    central_longitude = np.degrees(central_longitude)
-
-    centre_point = Point(-99, (central_latitude, central_longitude))
+    central_latitude = float(np.degrees(central_latitude))
+    central_longitude = float(np.degrees(central_longitude))
 
     # Calculate the maximum distance
-    max_distance = 0
-    for point in cluster:
-        max_distance = max(max_distance, point.distance(centre_point))
+    max_distance = float(distances(lats, lons, central_latitude, central_longitude).max())
 
-    return centre_point.coordinates, max_distance*1000
+    return (central_latitude, central_longitude), max_distance
@@ -0,0 +1,188 @@
+"""
+state_store:
+Versioned view of the mission state served by `/api/info`.
+
+Every change to the state that is seen by the store is given a sequence number, which increases by one for each
+refresh in which something changed. A client that passes the sequence number and epoch of its last response, as
+`/api/info?since=<seq>&epoch=<epoch>`, only receives the drones, detections and mission fields that have changed since, so the
+size of a poll is proportional to the changes rather than to the history of the mission.
+
+The drones and the mission are modified in place by other threads, so changes are found by comparing them with the
+snapshot taken at the previous refresh. Detections are read from the `DetectionLog` of the mission, by recording its
+revision at each refresh in which detections were added or merged into. A delta holds the detections added or merged
+into since, which replace those with the same `id` on the client. Full responses only hold the latest
+`FULL_STATE_DETECTIONS` detections, and older ones can be paged through from `/api/detections`.
+
+Responses are encoded by `encode_info()`. Each drone record is encoded once per change of the drone's
+`state_version`, and kept as bytes that every response concatenates, so polls of unchanged drones do not re-read or
+re-encode them. Mission fields are likewise encoded once per change. JSON is encoded with orjson if it is installed.
+
+Simulated paths are not part of the drone records, which only carry their `simulated_path_version`. Clients fetch a
+path once per version, from `/api/drones/<drone_id>/simulated_path?version=<version>`.
+"""
+import copy
+import json
+import secrets
+from collections import deque
+from threading import Lock
+from typing import Any, Callable, Deque, Dict, List, Tuple
+
+try:
+    import orjson
+except ImportError:     # orjson is optional, and only makes encoding faster
+    orjson = None
+
+from drone_utils import DroneId, DroneState
+from mission_utils import Mission
+
+# Drone fields that are read on every response rather than encoded with the drone, as they change on every cycle.
+# They do not by themselves mark a drone as changed.
+VOLATILE_DRONE_FIELDS: Dict[str, Callable[[DroneState], Any]] = {
+    "tick_lag": DroneState.get_tick_lag,
+}
+FULL_STATE_DETECTIONS = 1000  # Number of the latest detections in a full response
+# Mission fields that are sent as a whole when they change
+MISSION_FIELDS = {
+    "hotspots": "hotspots",
+    "clusters": "cluster_centres",
+    "clusters_to_explore": "cluster_centres_to_explore",
+}
+
+def dumps(obj: Any) -> bytes:
+    """ Encodes `obj` as compact JSON. """
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, separators=(",", ":")).encode()
+
+def encode_info(info: Dict) -> bytes:
+    """ Encodes a response of `StateStore.info()`, whose drone records and mission fields are already encoded. """
+    parts = []
+    for key, value in info.items():
+        if key == "drones":
+            value = b"{" + b",".join(b'"%d":%s' % (drone_id, record) for drone_id, record in value.items()) + b"}"
+        elif key not in MISSION_FIELDS:
+            value = dumps(value)
+        parts.append(b'"%s":%s' % (key.encode(), value))
+    return b"{" + b",".join(parts) + b"}"
+
+class StateStore:
+    """
+    Versioned state of the drones and the mission.
+    - `seq`: Sequence number of the latest change.
+    - `epoch`: Random token of this store, which clients pass back with `seq`, so that sequence numbers of another
+    store (e.g. before the server restarted) are never taken for its own.
+    Responses hold the drone records and mission fields as encoded JSON, to be encoded with `encode_info()`.
+    """
+    def __init__(self, mission: Mission, drone_states: Dict[DroneId, DroneState]):
+        self.mission = mission
+        self.drone_states = drone_states
+        self.seq = 0
+        self.epoch = secrets.token_hex(8)
+        self._lock = Lock()
+        # Sequence number of the last change, state version and encoded record (without the volatile fields and the
+        # closing brace) of each drone
+        self._drones: Dict[DroneId, Tuple[int, int, bytes]] = {}
+        # Sequence number of the last change, snapshot and encoded snapshot of each mission field
+        self._fields: Dict[str, Tuple[int, Any, bytes]] = {}
+        # State version, volatile field values and complete encoded record of each drone, as of the last response
+        # that included it
+        self._closed: Dict[DroneId, Tuple[int, Tuple, bytes]] = {}
+        # Revision of the detection log as of each refresh that changed detections, and as of before the oldest of them
+        self._detection_marks: Deque[Tuple[int, int]] = deque()
+        self._detection_base: Tuple[int, int] = (0, mission.detected.rev)
+
+    @staticmethod
+    def _encode_drone(drone_state: DroneState) -> bytes:
+        """ Encodes the record of a drone without its volatile fields, leaving it open for them. """
+        record = drone_state.toJSON(include_simulated_path=False)
+        for key in VOLATILE_DRONE_FIELDS:
+            del record[key]
+        return dumps(record)[:-1]
+
+    def _close_drone(self, drone_id: DroneId, version: int, encoded: bytes) -> bytes:
+        """ Completes the encoded record of a drone with the current values of its volatile fields. The lock must be held. """
+        drone_state = self.drone_states[drone_id]
+        values = tuple(get(drone_state) for get in VOLATILE_DRONE_FIELDS.values())
+        closed = self._closed.get(drone_id)
+        if closed is None or closed[:2] != (version, values):
+            closed = (version, values, encoded + b"".join(b',"%s":%s' % (key.encode(), dumps(value))
+                for key, value in zip(VOLATILE_DRONE_FIELDS, values)) + b"}")
+            self._closed[drone_id] = closed
+        return closed[2]
+
+    def _refresh(self):
+        """ Records the changes since the previous refresh under a new sequence number. The lock must be held. """
+        seq = self.seq + 1
+        changed = False
+
+        rev = self.mission.detected.rev
+        if rev != (self._detection_marks[-1] if self._detection_marks else self._detection_base)[1]:
+            if len(self._detection_marks) == self.mission.detected.capacity:
+                self._detection_base = self._detection_marks.popleft()
+            self._detection_marks.append((seq, rev))
+            changed = True
+
+        for drone_id, drone_state in self.drone_states.items():
+            version = drone_state.get_state_version()
+            last = self._drones.get(drone_id)
+            if last is not None and last[1] == version:
+                continue
+            encoded = self._encode_drone(drone_state)
+            if last is not None and last[2] == encoded:
+                self._drones[drone_id] = (last[0], version, encoded)
+                continue
+            self._drones[drone_id] = (seq, version, encoded)
+            changed = True
+
+        with self.mission.lock:
+            for name, attr in MISSION_FIELDS.items():
+                value = getattr(self.mission, attr)
+                last = self._fields.get(name)
+                if last is not None and last[1] == value:
+                    continue
+                self._fields[name] = (seq, copy.deepcopy(value), dumps(value))
+                changed = True
+
+        if changed:
+            self.seq = seq
+
+    def _detections_since(self, since: int) -> List[Dict]:
+        """ Returns the detections changed after sequence number `since`, or None if they are no longer known. The lock must be held. """
+        if since < self._detection_base[0]:
+            return None
+        rev = self._detection_base[1]
+        for seq, mark_rev in reversed(self._detection_marks):
+            if seq <= since:
+                rev = mark_rev
+                break
+        return self.mission.detected.changed_since(rev)
+
+    def info(self, since: int = None, epoch: str = None, refresh: bool = True) -> Dict:
+        """
+        Returns the state that has changed after sequence number `since` of store `epoch`, along with the current
+        sequence number and the epoch of this store. Returns the full state (with `full` set) if `since` is not
+        given, or is not a sequence number of this store, e.g. after the server has restarted.
+        - `refresh`: Whether to look for changes first. Otherwise, the state as of the last refresh is returned.
+        """
+        with self._lock:
+            if refresh:
+                self._refresh()
+            detected = None
+            if since is not None and epoch == self.epoch and 0 <= since <= self.seq:
+                detected = self._detections_since(since)
+            full = detected is None
+            if full:
+                since = -1
+                detected = self.mission.detected.recent(FULL_STATE_DETECTIONS)
+            ret = {
+                "epoch": self.epoch,
+                "seq": self.seq,
+                "full": full,
+                "drones": {drone_id: self._close_drone(drone_id, version, encoded)
+                    for drone_id, (seq, version, encoded) in self._drones.items() if seq > since},
+                "detected": detected,
+            }
+            for name, (seq, _, encoded) in self._fields.items():
+                if seq > since:
+                    ret[name] = encoded
+            return ret
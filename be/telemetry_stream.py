@@ -0,0 +1,135 @@
+"""
+telemetry_stream:
+Server-sent events (SSE) stream of the changes to the mission state, served by `/api/stream`.
+
+A single broadcaster thread reads the changes from the `StateStore` every `interval` seconds, coalescing every
+change made in between, and encodes them once as an SSE message that is shared by all clients. The cost of a tick
+therefore does not depend on the number of clients.
+
+Each client holds at most one undelivered message. If a client has not taken its message by the next tick, the
+message is dropped, and the client is sent the changes since the last message it took instead, read from the
+store without refreshing it. Slow clients therefore skip to the latest state rather than queueing messages.
+
+Messages carry the epoch and sequence number of the store as their event ID, `<epoch>-<seq>`, so a client that
+reconnects (as browsers do with `EventSource`) resumes from its last message with the `Last-Event-ID` header, and is
+sent the full state if the server has restarted since.
+
+Every client holds a worker thread of the server for as long as it is connected. With `max_clients`, new clients
+are turned away once that many are connected, so that a server with a fixed pool of threads keeps some for its other
+routes. The limit is checked when a client subscribes, so concurrent subscriptions may overshoot it slightly.
+"""
+from threading import Event, Lock, Thread
+from typing import Dict, Iterator, Set
+
+from state_store import StateStore, encode_info
+
+STREAM_INTERVAL = 1.0     # Seconds between messages to clients
+KEEPALIVE_INTERVAL = 15.0  # Seconds after which an idle stream is sent a comment, to keep proxies from closing it
+
+def encode_event(info: Dict) -> bytes:
+    """ Encodes a response of `StateStore.info()` as an SSE message. """
+    header = f"id: {info['epoch']}-{info['seq']}\nevent: {'state' if info['full'] else 'delta'}\ndata: ".encode()
+    return header + encode_info(info) + b"\n\n"
+
+class _Client:
+    """ A connected client, with the sequence number of the last message it took and its undelivered message. """
+    def __init__(self, seq: int):
+        self.seq = seq
+        self.message: bytes = None
+        self.message_seq: int = None
+        self.behind = False   # Whether a message was dropped, so the client must catch up from `seq`
+        self.ready = Event()
+        self.lock = Lock()
+
+    def offer(self, since: int, seq: int, message: bytes):
+        """ Offers the message of the changes from `since` to `seq`, dropping it if the client is not ready for it. """
+        with self.lock:
+            if self.message is None and not self.behind and self.seq == since:
+                self.message, self.message_seq = message, seq
+            else:
+                self.message = self.message_seq = None
+                self.behind = True
+        self.ready.set()
+
+class TelemetryStream:
+    """ Broadcasts the changes to the mission state to every connected client, at a fixed rate. """
+    def __init__(self, state_store: StateStore, interval: float = STREAM_INTERVAL, max_clients: int = None):
+        """
+        - `max_clients`: Maximum number of connected clients, or None for no limit.
+        """
+        self.state_store = state_store
+        self.interval = interval
+        self.max_clients = max_clients
+        self._clients: Set[_Client] = set()
+        self._lock = Lock()
+        self._seq: int = None   # Sequence number of the last broadcast
+        self._thread: Thread = None
+        self.exit = Event()
+
+    def __len__(self) -> int:
+        return len(self._clients)
+
+    def is_full(self) -> bool:
+        """ Whether `max_clients` clients are connected, so that new clients should be turned away. """
+        return self.max_clients is not None and len(self._clients) >= self.max_clients
+
+    def _run(self):
+        while not self.exit.wait(self.interval):
+            with self._lock:
+                clients = list(self._clients)
+            if not clients:
+                continue
+            since = self._seq
+            info = self.state_store.info(since, self.state_store.epoch)
+            self._seq = info["seq"]
+            if info["seq"] == since:
+                continue
+            message = encode_event(info)
+            for client in clients:
+                client.offer(since, info["seq"], message)
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._seq = self.state_store.seq
+                self._thread = Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def subscribe(self, since: int = None, epoch: str = None) -> Iterator[bytes]:
+        """
+        Returns the stream of SSE messages for a new client, starting with the changes after `since` of store
+        `epoch`, or the full state if they are not given. The client is removed when the stream is closed.
+        """
+        self._start()
+        return self._stream(since, epoch)
+
+    def _stream(self, since: int, epoch: str) -> Iterator[bytes]:
+        # The client is only added once the stream is read, so that it is always removed when the stream is closed
+        info = self.state_store.info(since, epoch)
+        client = _Client(info["seq"])
+        with self._lock:
+            self._clients.add(client)
+        try:
+            yield encode_event(info)
+            while not self.exit.is_set():
+                if not client.ready.wait(KEEPALIVE_INTERVAL):
+                    yield b": keepalive\n\n"
+                    continue
+                with client.lock:
+                    client.ready.clear()
+                    message, seq, behind = client.message, client.message_seq, client.behind
+                    client.message = client.message_seq = None
+                    client.behind = False
+                if behind:
+                    info = self.state_store.info(client.seq, self.state_store.epoch, refresh=False)
+                    if info["seq"] == client.seq:
+                        continue
+                    message, seq = encode_event(info), info["seq"]
+                if message is None:
+                    continue
+                yield message
+                with client.lock:
+                    client.seq = seq
+        finally:
+            with self._lock:
+                self._clients.discard(client)
@@ -115,7 +115,9 @@ export default function ClusteringTab({
               label="Search Algorithm"
               onChange={handleChange}>
               <MenuItem value={"bayes"}>Probabilistic (Bayes) - Min-Time Capture</MenuItem>
+              <MenuItem value={"lookahead"}>Probabilistic (Bayes, Lookahead) - Min-Time Capture</MenuItem>
               <MenuItem value={"spiral"}>Naive (Outward Spiral) - Guaranteed Capture</MenuItem>
+              <MenuItem value={"zigzag"}>Naive (Zigzag Sweep) - Guaranteed Capture</MenuItem>
             </Select>
           </FormControl>
           <Box sx={{ display: "flex", justifyContent: "center", mt: 2 }}>
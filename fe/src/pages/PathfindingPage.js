@@ -1,34 +1,122 @@
-import { useState, useEffect } from "react";
+import { useState, useEffect, useRef } from "react";
 import Map from "../components/Map";
 import SidebarComponent from "../components/SidebarComponent";
 
+const API_URL = "http://127.0.0.1:5000/api";
+const POLL_INTERVAL = 1000; // In ms, when server-sent events are not supported
+
 export default function Pathfinding() {
   const [map, setMap] = useState(null);
-  const [drones, setDrones] = useState([]);
+  const [droneStates, setDroneStates] = useState({});
+  const [simulatedPaths, setSimulatedPaths] = useState({});
   const [hotspots, setHotspots] = useState([]);
   const [clusters, setClusters] = useState([]);
   const [clustersToExplore, setClustersToExplore] = useState([]);
   const [detectedEntities, setDetectedEntities] = useState([]);
+  // Sequence number and store epoch of the last response, so that only the changes since are fetched
+  const seq = useRef(null);
+  const epoch = useRef(null);
+  // Version of the simulated path requested for each drone
+  const requestedPaths = useRef({});
+
+  useEffect(() => {
+    // Applies a response of /api/info, or a message of /api/stream
+    const applyState = (data) => {
+      seq.current = data["seq"];
+      epoch.current = data["epoch"];
+      // A full response replaces the state, otherwise only the changes are merged in
+      setDroneStates((prev) =>
+        data["full"] ? data["drones"] : { ...prev, ...data["drones"] }
+      );
+      // Detections that were merged into are sent again, and replace the previous version with the same id
+      setDetectedEntities((prev) => {
+        if (data["full"]) {
+          return data["detected"];
+        }
+        const byId = new Map(prev.map((entity) => [entity.id, entity]));
+        data["detected"].forEach((entity) => byId.set(entity.id, entity));
+        return Array.from(byId.values());
+      });
+      if ("hotspots" in data) {
+        setHotspots(Object.values(data["hotspots"]));
+      }
+      if ("clusters" in data) {
+        setClusters(Object.values(data["clusters"]));
+      }
+      if ("clusters_to_explore" in data) {
+        setClustersToExplore(Object.values(data["clusters_to_explore"]));
+      }
+    };
 
-  const url = "http://127.0.0.1:5000/api/info";
+    const poll = () => {
+      const since =
+        seq.current === null
+          ? ""
+          : `?since=${seq.current}&epoch=${epoch.current}`;
+      fetch(`${API_URL}/info${since}`, { mode: "cors" })
+        .then((response) => response.json())
+        .then(applyState)
+        .catch((error) => console.error("Error in fetching drone data:", error));
+    };
+    let interval = null;
+    const startPolling = () => {
+      poll();
+      interval = setInterval(poll, POLL_INTERVAL);
+    };
+
+    // Updates are pushed by the server. The browser reconnects by itself, resuming from the last message.
+    // If the server turns the stream away (e.g. it has too many clients), the page polls instead.
+    let stream = null;
+    if (window.EventSource) {
+      stream = new EventSource(`${API_URL}/stream`);
+      const onMessage = (event) => applyState(JSON.parse(event.data));
+      stream.addEventListener("state", onMessage);
+      stream.addEventListener("delta", onMessage);
+      stream.onerror = () => {
+        if (stream.readyState === EventSource.CLOSED && interval === null) {
+          startPolling();
+        }
+      };
+    } else {
+      startPolling();
+    }
+    return () => {
+      if (stream !== null) {
+        stream.close();
+      }
+      clearInterval(interval);
+    };
+  }, []);
+
+  // Fetch each new version of a simulated path once
   useEffect(() => {
-    fetch(url, { mode: "cors" })
-      .then((response) => response.json())
-      .then((data) => {
-        const parsedDrones = Object.values(data["drones"]);
-        setDrones(parsedDrones);
-        const parsedHotspots = Object.values(data["hotspots"]);
-        setHotspots(parsedHotspots);
-        const parsedClusters = Object.values(data["clusters"]);
-        setClusters(parsedClusters);
-        const parsedClusterToExplore = Object.values(
-          data["clusters_to_explore"]
+    Object.values(droneStates).forEach((drone) => {
+      const version = drone.simulated_path_version;
+      if (
+        drone.simulated_path_state !== "READY" ||
+        requestedPaths.current[drone.drone_id] === version
+      ) {
+        return;
+      }
+      requestedPaths.current[drone.drone_id] = version;
+      fetch(
+        `${API_URL}/drones/${drone.drone_id}/simulated_path?version=${version}`,
+        { mode: "cors" }
+      )
+        .then((response) => response.json())
+        .then((data) =>
+          setSimulatedPaths((prev) => ({ ...prev, [data["drone_id"]]: data }))
+        )
+        .catch((error) =>
+          console.error("Error in fetching simulated path:", error)
         );
-        setClustersToExplore(parsedClusterToExplore);
-        const parsedDetected = Object.values(data["detected"]);
-        setDetectedEntities(parsedDetected);
-      })
-      .catch((error) => console.error("Error in fetching drone data:", error));
+    });
+  }, [droneStates]);
+
+  const drones = Object.values(droneStates).map((drone) => {
+    const path = simulatedPaths[drone.drone_id];
+    const isCurrent = path && path.version === drone.simulated_path_version;
+    return { ...drone, simulated_path: isCurrent ? path.simulated_path : null };
   });
 
   return (